@@ -1,53 +1,99 @@
 #!/usr/bin/env python
+import itertools
+from fractions import Fraction
+from math import factorial
 import numpy as np
-from math import sqrt
 
-def get_binomial_prob(passed, trials, verbose=True):
-    """Compute the binomial probability of success
+#The statistics are shared with the other puzzles, see quant_puzzles.stats
+from quant_puzzles.stats import get_binomial_prob, get_wilson_interval, get_interval, \
+     sequential_prob, BinomialCounts
 
-    @param passed boolean array indicating if the given trial is 
-           successful (True) or not (False)
-    @param trials number of trials
-    @param verbose print probability and uncertainty
-    @return values prob, prob_err (probability and its uncertainty)
+def shift_bitsets(bits, shift):
+    """Shift multi-word bitsets towards the higher bits.
+    @param bits N*W uint64 array, one bitset per row
+           (bit k of the bitset is bit k%64 of word k//64)
+    @param shift number of bits (the same for all the rows)
+    @return shifted N*W uint64 array (the highest bits are lost)
     """
-    success = float( np.sum( map(int, passed) ) )
-    prob = success / float(trials)
-    prob_err = (1./float(trials)) * sqrt(success*(1.-success/float(trials)))
-    if verbose:
-        print "Probability:"
-        print "%lf +/- %lf" % (prob, prob_err)
-    return prob, prob_err
+    words, offset = divmod(shift, 64)
+    shifted = np.zeros_like(bits)
+    nwords = bits.shape[1]
+    if words >= nwords:
+        return shifted
+    shifted[:, words:] = bits[:, :nwords-words] << np.uint64(offset)
+    if offset:
+        shifted[:, words+1:] |= bits[:, :nwords-words-1] >> np.uint64(64-offset)
+    return shifted
 
 def check_subset(arr, target):
+    """Check, for each trial, if a subset of its dice sums to a target.
+    The sums reachable by the subsets of each trial are kept as a
+    bitset (bit k set if some subset sums to k), built one die at a
+    time for all the trials at once: adding a die of value v to the
+    subsets is a shift by v, so bits |= bits << v.
+    Only the sums up to the target are kept: one uint64 per trial for
+    targets below 64, multi-word bitsets (see shift_bitsets) above.
+
+    @param arr N*M array with the values (positive integers) of the
+           M dice of the N trials
+    @param target target sum (a non-empty subset is required)
+    @return boolean array, True for the trials with such a subset
     """
-    """    
-    #print "arr"
-    #print arr
-    sorted = np.sort( arr )
-    #print "sorted"
-    #print sorted
-    filt = []
-    for a in sorted:
-        filt.append( filter(lambda x: x <= target, a) )
-    filt = np.array( filt )
-    #print "filt"
-    #print filt
+    arr = np.asarray(arr)
+    if arr.ndim == 1:
+        arr = arr[:, None]
+    if (arr < 0).any():
+        raise ValueError("Dice values cannot be negative")
+    if target <= 0:
+        return np.zeros(len(arr), dtype=bool)
+    nwords = target // 64 + 1
+    if nwords == 1:
+        #bits 0..target of a single word
+        mask = np.uint64((1 << (target+1)) - 1)
+        bits = np.ones(len(arr), dtype=np.uint64)
+        for column in arr.T:
+            #values above the target cannot be used (and could overflow the shift)
+            shift = np.minimum(column, 64).astype(np.uint64)
+            shifted = np.where(column <= target, bits << shift, np.uint64(0))
+            bits |= shifted & mask
+        return (bits >> np.uint64(target)) & np.uint64(1) == 1
+    bits = np.zeros((len(arr), nwords), dtype=np.uint64)
+    bits[:, 0] = 1
+    for column in arr.T:
+        #the rows with the same value share the shift
+        for value in np.unique(column):
+            if 0 < value <= target:
+                rows = column == value
+                bits[rows] |= shift_bitsets(bits[rows], int(value))
+    word, offset = divmod(target, 64)
+    return (bits[:, word] >> np.uint64(offset)) & np.uint64(1) == 1
+
+#Exact subset probabilities already computed, by (ndice, target, faces)
+EXACT_SUBSET_PROBS = {}
 
-    passed = np.zeros( len(filt) )
-    for n, f in enumerate(filt):
-        for i, el in enumerate(f):
-            if el==target:
-                passed[n] = 1
-                break
-            else:
-                test = el
-                for j in range(i+1, len(f)):
-                    test += f[j]  
-                    if test == target:
-                        passed[n] = 1
-                        break
-    passed = np.array( passed, dtype=bool )
-    #print "passed"
-    #print passed
-    return passed
+def get_exact_subset_prob(ndice, target, faces=6):
+    """Compute exactly the probability that a subset of ndice fair
+    dice sums to a target (see check_subset).
+    Rolls are enumerated as sorted multisets of values (combinations
+    with repetition, far fewer than the faces**ndice ordered rolls),
+    each weighted by its number of orderings (multinomial coefficient).
+    Results are cached.
+
+    @param ndice number of dice
+    @param target target sum
+    @param faces number of faces of the dice (values 1..faces)
+    @return probability (as Fraction)
+    """
+    key = (ndice, target, faces)
+    if key not in EXACT_SUBSET_PROBS:
+        rolls = list(itertools.combinations_with_replacement(range(1, faces+1), ndice))
+        passed = check_subset(np.array(rolls, dtype=np.int64).reshape(len(rolls), ndice), target)
+        success = 0
+        for roll, ok in zip(rolls, passed):
+            if ok:
+                weight = factorial(ndice)
+                for value, group in itertools.groupby(roll):
+                    weight //= factorial(len(list(group)))
+                success += weight
+        EXACT_SUBSET_PROBS[key] = Fraction(success, faces**ndice)
+    return EXACT_SUBSET_PROBS[key]
@@ -4,13 +4,15 @@ import math
 import os, sys
 
 sys.path.append("../python")
-from prob_utils import get_binomial_prob, check_subset
+from prob_utils import get_binomial_prob, check_subset, get_exact_subset_prob
 
 def subset_prob(ndice, target, ntrials=1000000):
     
     outcome = np.random.randint(1, high=7, size=(ntrials, ndice))
     passed = check_subset(outcome, target)
     _,_ = get_binomial_prob(passed, ntrials)
+    prob = get_exact_subset_prob(ndice, target)
+    print "Exact: %s = %lf" % (prob, float(prob))
 
 if __name__ == "__main__":
     print "Probability of having a '3 subset' from 1 dice:"
@@ -1,27 +1,42 @@
 #!/usr/bin/env python
 import os, sys
+import multiprocessing
+from itertools import imap
 import numpy as np
 from numpy import random as rn
 from math import sqrt, sin, cos, pi
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
-def angle_to_chord(angle):
+#Default number of chords per block (see get_block_sizes)
+BLOCK_SIZE = 2**20
+#Default histogram edges of the chord lengths
+CHORD_EDGES = np.linspace(0., 2., 41)
+
+def angle_to_chord(angle, out=None):
     """Compute length of chord associated
     to a given angle in the unit circle
+    (element-wise on arrays, as a numpy ufunc)
     @param angle angle
+    @param out optional output array
     @return chord length
     """
-    return 2.*sin(angle/2.)
+    out = np.sin(np.multiply(angle, 0.5, out=out), out=out)
+    return np.multiply(out, 2., out=out)
 
-def midpoint_to_chord(midpoint):
+def midpoint_to_chord(midpoint, out=None):
     """Compute lenght of chord
     given the distance of the midpoint
     from the center of the (unit) circle
+    (element-wise on arrays, as a numpy ufunc)
     @param midpoint distance of the midpoint from the center
+    @param out optional output array
     @return chord length
     """
-    return 2.*sqrt(1. - midpoint**2)
+    out = np.square(midpoint, out=out)
+    out = np.subtract(1., out, out=out)
+    out = np.sqrt(out, out=out)
+    return np.multiply(out, 2., out=out)
 
 def get_chord_from_int_points(rho1, theta1, rho2, theta2):
     """Compute lenght of chord (in the unit circle) given the polar
@@ -59,6 +74,407 @@ def get_chord_from_int_points(rho1, theta1, rho2, theta2):
     #Chord length = sqrt( (xA-xB)**2 + (yA-yB)**2)
     return np.sqrt( (1+m2) * dx**2 )
 
+def chord_through_points(rho1, theta1, rho2, theta2, out=None, scratch=None):
+    """Compute lenght of chord (in the unit circle) given the polar
+    coordinates of two points in the circle, as get_chord_from_int_points,
+    without slopes (no division by x1-x2 for vertical chords) and without
+    temporary arrays.
+    The distance of the chord from the center is
+      d = |x1*y2 - x2*y1| / |P1-P2|
+    and, with s = sin(delta/2), c = cos(delta/2), delta = theta2-theta1,
+      d**2 = (2*rho1*rho2*s*c)**2 / ((rho1-rho2)**2 + 4*rho1*rho2*s**2)
+    (no cancellation for close points), so that the chord
+    length is 2*sqrt(1 - d**2).
+    @param rho1 first point rho coordinate
+    @param theta1 first point theta coordinate
+    @param rho2 second point rho coordinate
+    @param theta2 second point theta coordinate
+    @param out output array (its dtype, e.g. float32, is used for all the
+           computations), allocated if None
+    @param scratch pair of arrays with the shape and dtype of out,
+           reused across calls (allocated if None)
+    @return chord length (out)
+    """
+    if out is None:
+        out = np.empty(np.broadcast(rho1, theta1, rho2, theta2).shape)
+    if scratch is None:
+        scratch = (np.empty_like(out), np.empty_like(out))
+    a, b = scratch
+    np.subtract(theta2, theta1, out=out)
+    out *= 0.5
+    np.sin(out, out=a)
+    np.cos(out, out=out)
+    np.multiply(rho1, rho2, out=b)
+    #out = (2*rho1*rho2*s*c)**2
+    out *= a
+    out *= b
+    out *= out
+    out *= 4.
+    #b = (rho1-rho2)**2 + 4*rho1*rho2*s**2
+    a *= a
+    a *= b
+    a *= 4.
+    np.subtract(rho1, rho2, out=b)
+    b *= b
+    b += a
+    #out = d**2 (nan only if the two points coincide)
+    out /= b
+    np.subtract(1., out, out=out)
+    np.maximum(out, 0., out=out)
+    np.sqrt(out, out=out)
+    out *= 2.
+    return out
+
+def get_block_sizes(samples, block_size=BLOCK_SIZE):
+    """Split a number of samples in blocks.
+    @param samples number of samples (None: endless)
+    @param block_size number of samples per block (the last
+           block can be smaller)
+    @return generator over the block sizes
+    """
+    if samples is None:
+        while True:
+            yield block_size
+    for first in xrange(0, samples, block_size):
+        yield min(block_size, samples - first)
+
+def circumference_chords(samples, block_size=BLOCK_SIZE, rng=rn, buffers=None):
+    """Generate the chords between two random points on the
+    circumference of the unit circle, block by block.
+    Uniform angles between the points correspond to uniform points.
+    @param samples number of chords (None: endless)
+    @param block_size number of chords per block
+    @param rng random generator (numpy.random or a RandomState)
+    @param buffers not used (the chords overwrite the random angles),
+           same interface as int_points_chords
+    @return generator over the arrays of chord lengths
+    """
+    for size in get_block_sizes(samples, block_size):
+        yield angle_to_chord(rng.uniform(0., 2.*pi, size))
+
+def midpoint_chords(samples, block_size=BLOCK_SIZE, rng=rn, buffers=None):
+    """Generate the chords having a random point of the
+    unit circle as midpoint, block by block.
+    Uniform radii (generate r^2, pick up r) correspond to
+    uniform points inside the circle.
+    @param samples number of chords (None: endless)
+    @param block_size number of chords per block
+    @param rng random generator (numpy.random or a RandomState)
+    @param buffers not used (the chords overwrite the random radii),
+           same interface as int_points_chords
+    @return generator over the arrays of chord lengths
+    """
+    for size in get_block_sizes(samples, block_size):
+        midpoints = np.sqrt(rng.uniform(0., 1.0, size))
+        yield midpoint_to_chord(midpoints, out=midpoints)
+
+def int_points_chords(samples, block_size=BLOCK_SIZE, rng=rn, dtype=np.float64, buffers=None):
+    """Generate the chords passing through two random points
+    inside the unit circle, block by block (see chord_through_points).
+    The scratch arrays are allocated once per generator.
+    @param samples number of chords (None: endless)
+    @param block_size number of chords per block
+    @param rng random generator (numpy.random or a RandomState)
+    @param dtype float type of the chord lengths (float32 halves the
+           memory traffic, enough for histograms)
+    @param buffers dictionary keeping the output and scratch arrays
+           between generators (one set per dtype, grown for larger
+           blocks), e.g. across the blocks of run_chords: each block
+           then overwrites the previous one, also from another
+           generator sharing the dictionary. By default each block
+           gets a new output array.
+    @return generator over the arrays of chord lengths
+    """
+    reuse = buffers is not None
+    key = np.dtype(dtype)
+    if not reuse or key not in buffers or len(buffers[key][0]) < block_size:
+        chords = np.empty(block_size, dtype=dtype)
+        scratch = (np.empty_like(chords), np.empty_like(chords))
+        if reuse:
+            buffers[key] = chords, scratch
+    else:
+        chords, scratch = buffers[key]
+    for size in get_block_sizes(samples, block_size):
+        angles1 = rng.uniform(0., 2.*pi, size)
+        angles2 = rng.uniform(0., 2.*pi, size)
+        radii1 = rng.uniform(0., 1.0, size)
+        np.sqrt(radii1, out=radii1)
+        radii2 = rng.uniform(0., 1.0, size)
+        np.sqrt(radii2, out=radii2)
+        out = chords[:size] if reuse else np.empty(size, dtype=dtype)
+        yield chord_through_points(radii1, angles1, radii2, angles2, out,
+                                   (scratch[0][:size], scratch[1][:size]))
+
+class Histogram(object):
+    """Histogram with fixed bin edges, filled incrementally:
+    only the counts are kept, so the memory does not depend
+    on the number of entries.
+
+    To fill it block by block:
+    hist = Histogram(edges)
+    for values in blocks:
+        hist.update(values)
+
+    Histograms with the same edges (e.g. filled by different
+    processes or on different nodes) can be merged, and they
+    can be written to/read from numpy (.npz) files.
+    As numpy.histogram, the last bin includes its right edge;
+    values outside the edges are counted in underflow/overflow.
+    """
+    def __init__(self, edges=CHORD_EDGES, counts=None, underflow=0, overflow=0):
+        self.edges = np.array(edges, dtype=np.float64)
+        if counts is None:
+            self.counts = np.zeros(len(self.edges)-1, dtype=np.int64)
+        else:
+            self.counts = np.array(counts, dtype=np.int64)
+            if len(self.counts) != len(self.edges)-1:
+                raise ValueError("The counts do not match the bin edges")
+        self.underflow = underflow
+        self.overflow = overflow
+    def entries(self):
+        return int(self.counts.sum()) + self.underflow + self.overflow
+    def update(self, values):
+        """Add a block of values.
+        @param values array of values
+        @return the histogram itself
+        """
+        values = np.asarray(values)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+        self.underflow += int(np.count_nonzero(values < self.edges[0]))
+        self.overflow += int(np.count_nonzero(values > self.edges[-1]))
+        return self
+    def merge(self, other):
+        """Add the counts of another histogram with the same edges.
+        @param other histogram to merge
+        @return the histogram itself
+        """
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Only histograms with the same bin edges can be merged")
+        self.counts += other.counts
+        self.underflow += other.underflow
+        self.overflow += other.overflow
+        return self
+    def __iadd__(self, other):
+        return self.merge(other)
+    def __add__(self, other):
+        return self.copy().merge(other)
+    def __eq__(self, other):
+        return isinstance(other, Histogram) and np.array_equal(self.edges, other.edges) and \
+               np.array_equal(self.counts, other.counts) and \
+               (self.underflow, self.overflow) == (other.underflow, other.overflow)
+    def __ne__(self, other):
+        return not self == other
+    def copy(self):
+        return Histogram(self.edges, self.counts, self.underflow, self.overflow)
+    def save(self, filename):
+        """Write the histogram in numpy (.npz) format.
+        @param filename output file name
+        """
+        np.savez(filename, edges=self.edges, counts=self.counts,
+                 outliers=np.array([self.underflow, self.overflow], dtype=np.int64))
+    @classmethod
+    def load(cls, filename):
+        """Read a histogram written by save.
+        @param filename input file name
+        @return the histogram
+        """
+        data = np.load(filename)
+        underflow, overflow = data['outliers'].tolist()
+        return cls(data['edges'], data['counts'], underflow, overflow)
+
+def count_chords(blocks, side, edges=CHORD_EDGES):
+    """Accumulate the chords of a block generator, without keeping them.
+    @param blocks iterable over the arrays of chord lengths
+    @param side chords longer than side pass the selection
+    @param edges histogram bin edges
+    @return number of chords that passed, number of chords and
+            histogram of the chord lengths (see Histogram)
+    """
+    passed = 0
+    trials = 0
+    hist = Histogram(edges)
+    for chords in blocks:
+        passed += np.count_nonzero(chords > side)
+        trials += len(chords)
+        hist.update(chords)
+    return passed, trials, hist
+
+def get_block_rng(seed, index):
+    """Random generator of a block of samples.
+    Each block gets its own stream, seeded with the pair
+    (seed, block index) (as numpy SeedSequence.spawn does),
+    so the samples of a block do not depend on which process
+    generates it nor on the other blocks.
+    @param seed seed of the whole run
+    @param index index of the block
+    @return RandomState
+    """
+    return rn.RandomState([seed, index])
+
+#Arrays of the chord generators, kept by each process of
+#run_chords across its blocks (see sample_block)
+worker_buffers = {}
+
+def sample_block(args):
+    """Generate and count one block of chords (see run_chords).
+    The arrays of the generator are reused from one block to the
+    next one (see int_points_chords): each block is counted before
+    the next one starts.
+    @param args sampler, index and size of the block, seed,
+           side and histogram edges
+    @return number of chords that passed, number of chords and
+            histogram of the chord lengths
+    """
+    sampler, index, size, seed, side, edges = args
+    blocks = sampler(size, size, get_block_rng(seed, index), buffers=worker_buffers)
+    return count_chords(blocks, side, edges)
+
+def run_chords(sampler, samples, side, seed=42, block_size=BLOCK_SIZE, workers=1, edges=CHORD_EDGES):
+    """Generate and count chords over a pool of processes.
+    The samples are split in blocks with independent random
+    streams (see get_block_rng), and the block results are exact
+    sums: for a given seed and block size the result is the same
+    whatever the number of processes.
+    @param sampler block generator (e.g. circumference_chords)
+    @param samples number of chords
+    @param side chords longer than side pass the selection
+    @param seed seed of the run
+    @param block_size number of chords per block
+    @param workers number of processes (None: number of CPUs)
+    @param edges histogram bin edges
+    @return number of chords that passed, number of chords and
+            histogram of the chord lengths (see count_chords)
+    """
+    tasks = ( (sampler, index, size, seed, side, edges)
+              for index, size in enumerate(get_block_sizes(samples, block_size)) )
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    passed = 0
+    trials = 0
+    hist = Histogram(edges)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(sample_block, tasks) if pool else imap(sample_block, tasks)
+        for block_passed, block_trials, block_hist in results:
+            passed += block_passed
+            trials += block_trials
+            hist.merge(block_hist)
+        if pool:
+            pool.close()
+    finally:
+        if pool:
+            pool.terminate()
+            pool.join()
+    return passed, trials, hist
+
+class ScrambledHalton(object):
+    """Scrambled Halton sequence: low-discrepancy points in the unit
+    hypercube, for quasi-Monte Carlo integration.
+
+    Coordinate d of point i is the radical inverse of i in the d-th
+    prime base, with the digits shuffled by random permutations (one
+    per digit position): each point is uniformly distributed, while
+    the points together still fill the hypercube evenly, so averages
+    over independent scramblings give unbiased estimates and errors.
+
+    It can replace numpy.random in the chord generators
+    (e.g. circumference_chords): each call to uniform returns the
+    next coordinate of the same block of points, and a new block
+    starts after the last coordinate.
+    """
+    BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29)
+
+    def __init__(self, dims, rng=rn):
+        """Draw the digit permutations.
+        @param dims number of coordinates of the points
+        @param rng random generator of the scrambling
+        """
+        if not 0 < dims <= len(ScrambledHalton.BASES):
+            raise ValueError("Only up to %d dimensions are supported" % len(ScrambledHalton.BASES))
+        self.dims = dims
+        self.perms = []
+        self.tails = []
+        for base in ScrambledHalton.BASES[:dims]:
+            #enough digits for the resolution of a double
+            ndigits = int(np.ceil(53 * np.log(2) / np.log(base)))
+            perms = np.array([ rng.permutation(base) for k in range(ndigits) ], dtype=np.float64)
+            scales = float(base) ** -np.arange(1, ndigits+1)
+            self.perms.append( perms * scales[:, None] )
+            #contribution of the (shuffled) zero digits from position k on
+            self.tails.append( np.append(np.cumsum((perms[:, 0] * scales)[::-1])[::-1], 0.) )
+        self.index = 0
+        self.points = None
+        self.coordinate = dims
+
+    def get_points(self, first, size):
+        """Compute a block of points.
+        @param first index of the first point
+        @param size number of points
+        @return size*dims array
+        """
+        points = np.empty((size, self.dims))
+        for d, base in enumerate(ScrambledHalton.BASES[:self.dims]):
+            index = np.arange(first, first + size, dtype=np.int64)
+            coords = points[:, d]
+            coords[:] = 0.
+            perms = self.perms[d]
+            k = 0
+            while k < len(perms) and index.any():
+                coords += perms[k][index % base]
+                index //= base
+                k += 1
+            coords += self.tails[d][k]
+        return points
+
+    def uniform(self, low=0., high=1., size=None):
+        """Next coordinate of the current block of points, as
+        numpy.random.uniform (low and high are scalars).
+        @param size number of points of the block
+        @return array of size values in [low, high)
+        """
+        if self.coordinate == self.dims:
+            self.points = self.get_points(self.index, size)
+            self.index += size
+            self.coordinate = 0
+        elif size != len(self.points):
+            raise ValueError("All the coordinates of a block must have the same size")
+        values = self.points[:, self.coordinate] * (high - low) + low
+        self.coordinate += 1
+        return values
+
+#Number of uniform coordinates per chord of each generator
+CHORD_DIMS = {circumference_chords: 1, midpoint_chords: 1, int_points_chords: 4}
+
+def run_chords_qmc(sampler, samples, side, seed=42, block_size=BLOCK_SIZE, replicates=8, edges=CHORD_EDGES):
+    """Generate and count chords with randomized quasi-Monte Carlo:
+    the samples are split among independent scramblings of the
+    Halton sequence (see ScrambledHalton), and the spread of their
+    estimates gives the uncertainty (zero when all the scramblings
+    agree, e.g. if the selection boundary falls on the strata of
+    a one-dimensional sequence).
+    @param sampler block generator (e.g. circumference_chords, see CHORD_DIMS)
+    @param samples number of chords (of all the replicates)
+    @param side chords longer than side pass the selection
+    @param seed seed of the scramblings
+    @param block_size number of chords per block
+    @param replicates number of independent scramblings (at least 2)
+    @param edges histogram bin edges
+    @return probability that a chord passes, its uncertainty and
+            histogram of the chord lengths
+    """
+    if replicates < 2:
+        raise ValueError("At least 2 replicates are needed for the uncertainty")
+    dims = CHORD_DIMS[getattr(sampler, 'func', sampler)]
+    probs = []
+    hist = Histogram(edges)
+    for replicate in range(replicates):
+        size = samples // replicates
+        points = ScrambledHalton(dims, get_block_rng(seed, replicate))
+        passed, trials, replicate_hist = count_chords(sampler(size, block_size, points), side, edges)
+        probs.append( passed / float(trials) )
+        hist.merge(replicate_hist)
+    probs = np.array(probs)
+    return probs.mean(), probs.std(ddof=1) / np.sqrt(replicates), hist
 
 class Plotter(object):
     """Handler to plot the distribution
@@ -74,10 +490,16 @@ class Plotter(object):
     def __add_patch__(self, label, color):
         self.__patches__.append( mpatches.Patch(color=color, label=label, alpha=0.5) )
     def add_plot(self, data, label, color):
+        """Add a distribution: array of samples,
+        or Histogram (already binned, see count_chords)
+        """
         self.hist.append( data )
         self.labels.append( label )
         self.colors.append( color )
         self.__add_patch__(label, color)
+    def add_counts(self, counts, edges, label, color):
+        """Add a distribution already binned."""
+        self.add_plot( Histogram(edges, counts), label, color )
     def add_reference(self, ref, label, color):
         self.refs.append( ref )
         self.colors_ref.append( color )
@@ -87,7 +509,11 @@ class Plotter(object):
         ax = fig.add_subplot(111)
         #Plot distribution of chord length                                                                                                          
         for data, label, color in zip(self.hist, self.labels, self.colors):
-            plt.hist(data, normed=True, color=color, bins=bins, alpha=0.5)
+            if isinstance(data, Histogram):
+                #Pre-binned counts: one weighted entry per bin
+                plt.hist(data.edges[:-1], weights=data.counts, normed=True, color=color, bins=data.edges, alpha=0.5)
+            else:
+                plt.hist(data, normed=True, color=color, bins=bins, alpha=0.5)
         for ref, color in zip(self.refs, self.colors_ref):
             plt.axvline(x=ref, color=color, alpha=0.5)
         plt.xlabel('chord length')
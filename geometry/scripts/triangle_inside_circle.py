@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import os, sys
+from functools import partial
 import numpy as np
 from numpy import random as rn
 from math import sqrt, sin, cos, pi
@@ -7,10 +8,11 @@ import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
 sys.path.append("../python")
-from triangle_circle_utils import angle_to_chord, midpoint_to_chord, get_chord_from_int_points, Plotter
-from prob_utils import get_binomial_prob
+from triangle_circle_utils import circumference_chords, midpoint_chords, int_points_chords, run_chords, run_chords_qmc, \
+     BLOCK_SIZE, Plotter
+from prob_utils import get_binomial_prob, sequential_prob
 
-def two_points_on_circumference(samples=10000000, seed=42):
+def two_points_on_circumference(samples=10000000, seed=42, block_size=BLOCK_SIZE, workers=None, qmc=False):
     """Given two random points on the circumference of a (unit) circle, it computes the
     probability that the length of the chord is
     bigger than the side of the equilateral triangle
@@ -18,86 +20,124 @@ def two_points_on_circumference(samples=10000000, seed=42):
 
     @param samples number of samples for the Monte Carlo generation
     @param seed seed for the Monte Carlo generation
-    @return array with length of generated chords
+    @param block_size number of samples generated at once
+    @param workers number of processes (default: number of CPUs), the result
+           only depends on seed and block_size (see run_chords)
+    @param qmc use randomized quasi-Monte Carlo (scrambled Halton points, in
+           a single process): far fewer samples are needed (see run_chords_qmc)
+    @return histogram of the length of generated chords (see Histogram)
     """
 
     print "Generate pairs of points on a circumference with equilateral triangle inscribed..."
-    #Set seed
-    rn.seed(seed)
     #The side of the triangle is 2*r*cos30 = 2*r*sqrt(3)/2 = sqrt(3) (r=1)
     side = sqrt(3)
     print "Side of triangle: %f" % side 
-    #Uniform angles correspond to uniform points on the circumference
-    angles = rn.uniform(0.,2.*pi,samples)
-    #Get length of all chords corresponding to the angles
-    chords = np.array( map(angle_to_chord, angles ) )
-    #Compute probability and (binomial) uncertainty
-    passed = chords > side
-    prob, prob_err = get_binomial_prob(passed, samples)
+    #Uniform angles correspond to uniform points on the circumference:
+    #get length of all chords corresponding to the angles, block by block
+    if qmc:
+        prob, prob_err, hist = run_chords_qmc(circumference_chords, samples, side, seed, block_size)
+        print "Probability (quasi-Monte Carlo):"
+        print "%lf +/- %lf" % (prob, prob_err)
+    else:
+        passed, trials, hist = run_chords(circumference_chords, samples, side, seed, block_size, workers)
+        #Compute probability and (binomial) uncertainty
+        prob, prob_err = get_binomial_prob(passed, trials)
     print "(expected = 1/3)"
-    return chords
+    return hist
 
-def random_midpoint(samples=10000000, seed=42):
+def random_midpoint(samples=10000000, seed=42, block_size=BLOCK_SIZE, workers=None, qmc=False):
     """Given a random point in the (unit) circle, it computes the probability that
     the lenght of the chord having this point as midpoint is bigger than
     than the side of the equilateral triangle inscribed in the circle.
 
     @param samples number of samples for the Monte Carlo generation                                                                    
     @param seed seed for the Monte Carlo generation                                                                                         
-    @return array with length of generated chords
+    @param block_size number of samples generated at once
+    @param workers number of processes (default: number of CPUs), the result
+           only depends on seed and block_size (see run_chords)
+    @param qmc use randomized quasi-Monte Carlo (scrambled Halton points, in
+           a single process): far fewer samples are needed (see run_chords_qmc)
+    @return histogram of the length of generated chords (see Histogram)
     """
 
     print "Generate chords by selecting random midpoints in circle with equilateral triangle inscribed..."
-    #Set seed
-    rn.seed(seed)
     #The side of the triangle is 2*r*cos30 = 2*r*sqrt(3)/2 = sqrt(3) (r=1)
     side = sqrt(3)
     print "Side of triangle: %f" % side
-    #Uniform radii correspond to uniform points inside the circle
-    midpoints = np.sqrt( rn.uniform(0.,1.0,samples) )
-    #Get corresponding chord length
-    chords = np.array( map(midpoint_to_chord, midpoints) )
-    #Compute probability and (binomial) uncertainty
-    passed = chords > side
-    prob, prob_err = get_binomial_prob(passed, samples)
+    #Uniform radii correspond to uniform points inside the circle:
+    #get corresponding chord length, block by block
+    if qmc:
+        prob, prob_err, hist = run_chords_qmc(midpoint_chords, samples, side, seed, block_size)
+        print "Probability (quasi-Monte Carlo):"
+        print "%lf +/- %lf" % (prob, prob_err)
+    else:
+        passed, trials, hist = run_chords(midpoint_chords, samples, side, seed, block_size, workers)
+        #Compute probability and (binomial) uncertainty
+        prob, prob_err = get_binomial_prob(passed, trials)
     print "(expected = 1/4)"
-    return chords
+    return hist
 
-def two_points_in_circle(samples=10000000, seed=42):
+def two_points_in_circle(samples=10000000, seed=42, block_size=BLOCK_SIZE, workers=None, dtype=np.float64, qmc=False):
     """Given two random points in the (unit) circle, it computes the probability that
     the length of the chord passing through this pair of points is bigger than
     the side of the equilateral triangle inscribed in the circle
 
     @param samples number of samples for the Monte Carlo generation                                                                            
     @param seed seed for the Monte Carlo generation                                                                                                              
-    @return array with length of generated chords
+    @param block_size number of samples generated at once
+    @param workers number of processes (default: number of CPUs), the result
+           only depends on seed and block_size (see run_chords)
+    @param qmc use randomized quasi-Monte Carlo (scrambled Halton points, in
+           a single process): far fewer samples are needed (see run_chords_qmc)
+    @param dtype float type of the chord lengths (np.float32 is enough for the
+           histogram and the probability, see int_points_chords)
+    @return histogram of the length of generated chords (see Histogram)
     """
     print "Generate chords by selecting random pairs of points inside circle with equilateral triangle inscribed..."
-    #Set seed
-    rn.seed(seed)
     #The side of the triangle is 2*r*cos30 = 2*r*sqrt(3)/2 = sqrt(3) (r=1)
     side = sqrt(3)
     print "Side of triangle: %f" % side
-    #Generate uniform angles
-    angles1 = rn.uniform(0.,2.*pi,samples)
-    angles2 = rn.uniform(0.,2.*pi,samples)
-    #Generate uniform radii (generate r^2, pick up r)
-    radii1 = np.array( map(sqrt, rn.uniform(0.,1.0,samples)) )
-    radii2 = np.array( map(sqrt, rn.uniform(0.,1.0,samples)) )
-    #Compute lenghts
-    chords = get_chord_from_int_points(radii1, angles1, radii2, angles2)
-    #Compute probability and (binomial) uncertainty
-    passed = chords > side
-    prob, prob_err = get_binomial_prob(passed, samples)
-    return chords
+    #Generate uniform angles and radii, compute lenghts block by block
+    if qmc:
+        prob, prob_err, hist = run_chords_qmc(partial(int_points_chords, dtype=dtype), samples, side, seed, block_size)
+        print "Probability (quasi-Monte Carlo):"
+        print "%lf +/- %lf" % (prob, prob_err)
+    else:
+        passed, trials, hist = run_chords(partial(int_points_chords, dtype=dtype), samples, side, seed, block_size, workers)
+        #Compute probability and (binomial) uncertainty
+        prob, prob_err = get_binomial_prob(passed, trials)
+    return hist
+
+def prob_to_precision(sampler, target, seed=42, block_size=10000):
+    """Estimate the probability that a chord is longer than the side of
+    the equilateral triangle, generating only the samples needed to
+    reach the required precision (see sequential_prob).
+
+    @param sampler block generator (e.g. circumference_chords)
+    @param target required half-width of the (95%) Wilson interval
+    @param seed seed for the Monte Carlo generation
+    @param block_size number of samples generated at once
+    @return values prob, prob_err, samples
+    """
+    side = sqrt(3)
+    #each block is compared before the next one overwrites the arrays
+    blocks = ( chords > side for chords in sampler(None, block_size, rn.RandomState(seed), buffers={}) )
+    return sequential_prob(blocks, target, interval='wilson')
 
 if __name__ == "__main__":
     c1 = two_points_on_circumference()
     c2 = random_midpoint()
-    c3 = two_points_in_circle()
+    c3 = two_points_in_circle(dtype=np.float32)
     plotter = Plotter()
     plotter.add_plot(c1, '2 points on circumference', 'blue')
     plotter.add_plot(c2, 'random midpoint', 'red')
     plotter.add_plot(c3, '2 points inside circle', 'green')
     plotter.add_reference(sqrt(3), 'side of triangle', 'black')
     plotter.plot(40, 'plot.pdf')
+    #Same probabilities, with just enough samples for a precision of 0.001
+    for sampler in [circumference_chords, midpoint_chords, int_points_chords]:
+        prob_to_precision(sampler, 0.001)
+    #Same probabilities with quasi-Monte Carlo, from 2**18 samples
+    two_points_on_circumference(2**18, qmc=True)
+    random_midpoint(2**18, qmc=True)
+    two_points_in_circle(2**18, qmc=True)
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+import os
+import numpy as np
+
+class CSRGraph(object):
+    """Class representing a non-oriented graph
+    in compressed sparse row (CSR) form.
+
+    To instantiate a graph:
+    graph = CSRGraph(labels=labels, offsets=offsets, neighbours=neighbours)
+
+    labels is the array with the label of each vertex
+    (vertices are indexed as 0..n-1).
+
+    The neighbours (as vertex indices) of vertex i are
+    neighbours[offsets[i]:offsets[i+1]], so every edge is
+    stored twice (once for each endpoint).
+
+    Example (see karger.Graph):
+
+    1   4
+     \ / \
+      3 - 5
+     /
+    2
+
+    labels     = [1, 2, 3, 4, 5]
+    offsets    = [0, 1, 2, 6, 8, 10]
+    neighbours = [2, 2, 0, 1, 3, 4, 2, 4, 2, 3]
+    """
+    def __init__(self, labels, offsets, neighbours):
+        self.labels = labels
+        self.offsets = offsets
+        self.neighbours = neighbours
+    def nvtx(self):
+        return len(self.labels)
+    def get_neighbours(self, i):
+        return self.neighbours[self.offsets[i]:self.offsets[i+1]]
+    def edges(self):
+        """Flat edge arrays, as in karger.Graph.build_edges:
+        every edge is returned once as the pair (tails[k], heads[k])
+        with tails[k] < heads[k] (self loops are dropped).
+        @returns tails, heads (as int32 arrays)
+        """
+        tails = np.repeat( np.arange(self.nvtx(), dtype=np.int32), np.diff(self.offsets) )
+        keep = tails < self.neighbours
+        return tails[keep], np.asarray(self.neighbours[keep], dtype=np.int32)
+    def save(self, folder):
+        """Write the graph in binary (.npy) format.
+        @param folder output folder (created if needed)
+        """
+        if not os.path.isdir(folder):
+            os.makedirs(folder)
+        for name in ('labels', 'offsets', 'neighbours'):
+            np.save(os.path.join(folder, name+'.npy'), getattr(self, name))
+    @classmethod
+    def load(cls, folder, mmap=True):
+        """Read a graph written by save.
+        @param folder input folder
+        @param mmap memory-map the arrays instead of reading them
+        @returns the graph
+        """
+        mode = 'r' if mmap else None
+        arrays = [ np.load(os.path.join(folder, name+'.npy'), mmap_mode=mode)
+                   for name in ('labels', 'offsets', 'neighbours') ]
+        return cls(*arrays)
+
+def get_indices(labels, query):
+    """Convert vertex labels into vertex indices.
+    @param labels label of each vertex
+    @param query labels to convert
+    @returns the vertex indices (as int32 array)
+    """
+    order = np.argsort(labels, kind='mergesort')
+    pos = np.searchsorted(labels, query, sorter=order)
+    pos = np.minimum(pos, len(labels)-1)
+    if len(query) and not np.array_equal(labels[order[pos]], query):
+        raise ValueError("The graph contains edges to unknown vertices")
+    return order[pos].astype(np.int32)
+
+def read_adjlist(filename):
+    """Read a graph in adjacency-list format (see karger.Graph):
+    one line per vertex, with the vertex label first and
+    then the labels of the connected vertices.
+    @param filename input file name
+    @returns the graph (as CSRGraph)
+    """
+    rows = []
+    with open(filename, 'r') as file:
+        for line in file:
+            if line.strip():
+                rows.append( np.fromstring(line, dtype=np.int64, sep=' ') )
+    labels = np.array([ row[0] for row in rows ], dtype=np.int64)
+    degrees = np.array([ len(row)-1 for row in rows ], dtype=np.int32)
+    offsets = np.zeros(len(rows)+1, dtype=np.int32)
+    np.cumsum(degrees, out=offsets[1:])
+    if len(rows):
+        neighbours = get_indices(labels, np.concatenate([ row[1:] for row in rows ]))
+    else:
+        neighbours = np.zeros(0, dtype=np.int32)
+    return CSRGraph(labels, offsets, neighbours)
+
+def read_edgelist(filename):
+    """Read a graph in edge-list format: one line per edge
+    with the labels of its two endpoints (lines starting
+    with '#' are comments). The vertices are sorted by label.
+    @param filename input file name
+    @returns the graph (as CSRGraph)
+    """
+    with open(filename, 'r') as file:
+        text = ''.join( line for line in file if not line.startswith('#') )
+    pairs = np.fromstring(text, dtype=np.int64, sep=' ')
+    if len(pairs) % 2:
+        raise ValueError("Each line of an edge list must contain two vertices")
+    pairs = pairs.reshape(-1, 2)
+    labels, index = np.unique(pairs, return_inverse=True)
+    index = index.reshape(-1, 2).astype(np.int32)
+    #Store every edge in both directions, grouped by the first vertex
+    src = np.concatenate( (index[:, 0], index[:, 1]) )
+    dst = np.concatenate( (index[:, 1], index[:, 0]) )
+    order = np.argsort(src, kind='mergesort')
+    offsets = np.zeros(len(labels)+1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=len(labels)), out=offsets[1:])
+    return CSRGraph(labels, offsets, dst[order])
+
+def load_graph(filename, fmt='adjlist', cache=True):
+    """Load a graph from a text file, using a binary cache.
+    The first time, the text file is parsed and the graph is saved
+    in binary format in the folder filename+'.'+fmt+'.csr'. Later loads
+    memory-map the cache instead, unless the text file is newer.
+    @param filename input file name
+    @param fmt file format: 'adjlist' (see read_adjlist)
+               or 'edgelist' (see read_edgelist)
+    @param cache use (and write) the binary cache
+    @returns the graph (as CSRGraph)
+    """
+    readers = {'adjlist': read_adjlist, 'edgelist': read_edgelist}
+    if fmt not in readers:
+        raise ValueError("Unknown graph format '%s'" % fmt)
+    folder = filename + '.' + fmt + '.csr'
+    #The neighbours are the last array to be written
+    last = os.path.join(folder, 'neighbours.npy')
+    if cache and os.path.exists(last) and \
+       os.path.getmtime(last) >= os.path.getmtime(filename):
+        return CSRGraph.load(folder)
+    graph = readers[fmt](filename)
+    if cache:
+        graph.save(folder)
+    return graph
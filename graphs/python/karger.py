@@ -1,7 +1,10 @@
 #!/usr/bin/env python
-from math import log
+from math import log, sqrt, ceil
 from random import randint
+import random
+import heapq
 import copy
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -46,6 +49,234 @@ class Vertex(object):
         print "List of edges:"
         print self.e
 
+class UnionFind(object):
+    """Disjoint-set forest over the vertex indices 0..n-1,
+    with union by size and path halving.
+
+    It replaces the explicit supervertex objects: two vertices
+    belong to the same supervertex if they have the same root.
+
+    To instantiate it:
+    uf = UnionFind(n)
+
+    count is the number of disjoint sets (supervertices) left.
+    """
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1]*n
+        self.count = n
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    def union(self, x, y):
+        """Merge the sets containing x and y.
+        @returns True if a merge happened,
+                 False if x and y were already in the same set
+        """
+        rx = self.find(x)
+        ry = self.find(y)
+        if rx == ry:
+            return False
+        if self.size[rx] < self.size[ry]:
+            rx, ry = ry, rx
+        self.parent[ry] = rx
+        self.size[rx] += self.size[ry]
+        self.count -= 1
+        return True
+
+def random_contraction(nvtx, tails, heads, stop=2, rng=random, weights=None):
+    """Karger contraction of a graph given as flat edge arrays.
+    Picking a random edge among the ones left and contracting it
+    is equivalent to visiting the edges in a random order and
+    merging their endpoints, skipping the ones that have already
+    become self loops. The random order is drawn lazily
+    (partial Fisher-Yates), so the contraction ends as soon as
+    stop supervertices are left.
+    If the edges are weighted (i.e. w parallel edges are stored once
+    with weight w), the position of the first of the w copies in a
+    random order is drawn directly, as an exponential key of rate w.
+    @param nvtx number of vertices (indexed as 0..nvtx-1)
+    @param tails, heads edge endpoints (as lists)
+    @param stop number of supervertices to contract down to
+    @param rng random number generator (random module by default)
+    @param weights edge multiplicities (as a list), None if all are 1
+    @returns UnionFind state of the contraction
+    """
+    nedges = len(tails)
+    uf = UnionFind(nvtx)
+    if weights is not None:
+        keys = [ (-log(1.-rng.random())/w, k) for k, w in enumerate(weights) ]
+        heapq.heapify(keys)
+        while keys and uf.count > stop:
+            _, k = heapq.heappop(keys)
+            uf.union(tails[k], heads[k])
+        return uf
+    order = list(range(nedges))
+    for k in range(nedges):
+        if uf.count <= stop:
+            break
+        j = k + int(rng.random() * (nedges-k))
+        order[k], order[j] = order[j], order[k]
+        uf.union(tails[order[k]], heads[order[k]])
+    return uf
+
+def get_karger_stein_depth(nvtx):
+    """Depth of the Karger-Stein recursion tree, following the
+    contraction steps of Graph.karger_stein (from n to
+    ceil(1 + n/sqrt(2)) supervertices, down to at most 6).
+    @param nvtx number of vertices
+    @returns number of contraction steps
+    """
+    depth = 0
+    while nvtx > 6:
+        nvtx = int(ceil(1 + nvtx/sqrt(2)))
+        depth += 1
+    return depth
+
+def stoer_wagner(nvtx, tails, heads, weights=None):
+    """Stoer-Wagner deterministic global minimum cut.
+    Each phase grows a maximum adjacency ordering of the
+    supervertices left (using a heap with lazy deletion): the
+    connectivity of the last vertex t added is the minimum cut
+    separating it from the one added before, s. Then s and t are
+    merged and the next phase starts, until one supervertex is left.
+    It runs in O(V*E*log(V)).
+    @param nvtx number of vertices (indexed as 0..nvtx-1)
+    @param tails, heads edge endpoints (as lists)
+    @param weights edge multiplicities (as a list), None if all are 1
+    @returns minimum cut and side of each vertex
+             (True if in the same partition as vertex 0)
+    """
+    if weights is None:
+        weights = [1]*len(tails)
+    adj = [ dict() for i in range(nvtx) ]
+    for u, v, w in zip(tails, heads, weights):
+        adj[u][v] = adj[u].get(v, 0) + w
+        adj[v][u] = adj[v].get(u, 0) + w
+    members = [ [i] for i in range(nvtx) ]
+    active = list(range(nvtx))
+    min_cut = None
+    best_members = list(range(nvtx))
+    while len(active) > 1:
+        #Maximum adjacency ordering
+        connectivity = dict.fromkeys(active, 0)
+        heap = [ (0, active[0]) ]
+        added = set()
+        order = []
+        while heap:
+            w, v = heapq.heappop(heap)
+            if v in added or -w != connectivity[v]:
+                continue
+            added.add(v)
+            order.append(v)
+            cut_of_phase = -w
+            for u, wu in adj[v].items():
+                if u not in added:
+                    connectivity[u] += wu
+                    heapq.heappush(heap, (-connectivity[u], u))
+        if len(order) < len(active):
+            #Disconnected graph
+            min_cut = 0
+            best_members = [ m for v in order for m in members[v] ]
+            break
+        s, t = order[-2], order[-1]
+        if min_cut is None or cut_of_phase < min_cut:
+            min_cut = cut_of_phase
+            best_members = list(members[t])
+        #Merge t into s
+        for u, w in adj[t].items():
+            del adj[u][t]
+            if u != s:
+                adj[s][u] = adj[s].get(u, 0) + w
+                adj[u][s] = adj[u].get(s, 0) + w
+        adj[t] = None
+        members[s] += members[t]
+        active.remove(t)
+    if min_cut is None:
+        min_cut = 0
+    side = [False]*nvtx
+    for m in best_members:
+        side[m] = True
+    return min_cut, [s == side[0] for s in side]
+
+class ConvergenceHistory(object):
+    """Compact record of the convergence of Graph.find_min_cut.
+
+    Instead of the best cut found after each trial, only the
+    improvements are stored: values[k] is the best cut found
+    from trial trials[k] on (trials are counted from 0).
+
+    To instantiate it:
+    history = ConvergenceHistory()
+    """
+    def __init__(self):
+        self.trials = []
+        self.values = []
+        self.ntrials = 0
+    def __len__(self):
+        return self.ntrials
+    def append(self, value):
+        """Record the best cut found after one more trial.
+        @param value best cut found so far
+        """
+        if not self.values or value < self.values[-1]:
+            self.trials.append( self.ntrials )
+            self.values.append( value )
+        self.ntrials += 1
+    def since_improvement(self):
+        """Number of trials since the last improvement."""
+        if not self.trials:
+            return self.ntrials
+        return self.ntrials - self.trials[-1] - 1
+    def tolist(self):
+        """Best cut found after each trial (as a list)."""
+        values = []
+        for k, value in enumerate(self.values):
+            end = self.trials[k+1] if k+1 < len(self.trials) else self.ntrials
+            values += [value] * (end - self.trials[k])
+        return values
+
+class FenwickTree(object):
+    """Binary indexed tree over n non-negative weights,
+    to draw an index with probability proportional to its
+    weight, and to update a weight, in O(log(n)).
+
+    To instantiate it:
+    tree = FenwickTree(weights)
+    """
+    def __init__(self, weights):
+        self.n = len(weights)
+        self.tree = [0] + list(weights)
+        for i in range(1, self.n+1):
+            j = i + (i & -i)
+            if j <= self.n:
+                self.tree[j] += self.tree[i]
+        self.total = sum(weights)
+    def add(self, i, delta):
+        self.total += delta
+        i += 1
+        while i <= self.n:
+            self.tree[i] += delta
+            i += i & -i
+    def find(self, r):
+        """Smallest index i such that the sum of the
+        weights up to i (included) is larger than r.
+        @param r value in [0, total)
+        @returns index
+        """
+        i = 0
+        step = 1 << self.n.bit_length()
+        while step:
+            j = i + step
+            if j <= self.n and self.tree[j] <= r:
+                i = j
+                r -= self.tree[j]
+            step >>= 1
+        return i
+
 class Graph(object):
     """Class representing a non-oriented graph.
     
@@ -70,14 +301,61 @@ class Graph(object):
     """
     def __init__(self, adjlist=None):
         self.adjlist = []
+        self.labels = []
+        self.tails = np.zeros(0, dtype=np.int32)
+        self.heads = np.zeros(0, dtype=np.int32)
         if adjlist is not None:
             self.add_vertices(adjlist)
-        self.min_cuts = []
+        self.min_cuts = ConvergenceHistory()
+    @classmethod
+    def from_edges(cls, labels, tails, heads):
+        """Build a graph directly from the flat edge arrays
+        (see build_edges), without the Vertex objects: only the
+        backends working on the edge arrays can be used on it.
+        @param labels vertex labels (as list or array)
+        @param tails, heads edge endpoints (as vertex indices)
+        @returns the graph
+        """
+        graph = cls()
+        graph.labels = labels
+        graph.tails = np.asarray(tails, dtype=np.int32)
+        graph.heads = np.asarray(heads, dtype=np.int32)
+        return graph
+    @classmethod
+    def from_csr(cls, csr):
+        """Build a graph from a graph_io.CSRGraph
+        (e.g. as returned by graph_io.load_graph),
+        see from_edges.
+        @param csr the graph in CSR form
+        @returns the graph
+        """
+        tails, heads = csr.edges()
+        return cls.from_edges(csr.labels, tails, heads)
     def clone(self):
         return copy.deepcopy(self)
     def add_vertices(self, adjlist):
         for vertex in adjlist:
             self.adjlist.append( Vertex(v=[vertex[0]], e=vertex[1:]) )
+        self.build_edges()
+    def build_edges(self):
+        """Build the flat edge arrays used by the union-find backend.
+        Vertices are re-indexed as 0..n-1 (self.labels maps an index
+        back to the original vertex label), and every undirected edge
+        is stored once as the pair (self.tails[k], self.heads[k]).
+        Parallel edges are kept, self loops are dropped.
+        """
+        self.labels = [vertex.v[0] for vertex in self.adjlist]
+        index = dict( (label, i) for i, label in enumerate(self.labels) )
+        tails = []
+        heads = []
+        for i, vertex in enumerate(self.adjlist):
+            for label in vertex.e:
+                j = index[label]
+                if i < j:
+                    tails.append(i)
+                    heads.append(j)
+        self.tails = np.array(tails, dtype=np.int32)
+        self.heads = np.array(heads, dtype=np.int32)
     def get_random_edge(self):
         vertex1 = self.adjlist[ randint(0, len(self.adjlist)-1 ) ]
         vtx1 = self.adjlist.index( vertex1 )
@@ -89,7 +367,356 @@ class Graph(object):
     def contract_vertices(self, vtx1, vtx2):
         self.adjlist[vtx1].contract( self.adjlist[vtx2] )
         self.adjlist.pop( vtx2 )
-    def find_min_cut(self, ncalls=-1, debug=False):
+    def count_cut(self, side, tails, heads):
+        """Count the edges crossing a partition.
+        @param side list of booleans, True for the vertices
+                    in the same partition as vertex 0
+        @param tails, heads edge endpoints (as lists)
+        @returns number of crossing edges
+        """
+        cut = 0
+        for u, v in zip(tails, heads):
+            if side[u] != side[v]:
+                cut += 1
+        return cut
+    def get_partitions(self, side):
+        """Convert a partition into lists of vertex labels.
+        @param side list of booleans, True for the vertices
+                    in the same partition as vertex 0
+        @returns the two partitions (as lists of vertex labels)
+        """
+        labels = np.asarray(self.labels)
+        side = np.asarray(side, dtype=bool)
+        return labels[side].tolist(), labels[~side].tolist()
+    def contract_unionfind(self, tails, heads, rng=random):
+        """Run a single Karger trial on the flat edge arrays
+        (see random_contraction).
+        The first partition is the supervertex containing vertex 0,
+        the second one is everything else (if the graph is
+        disconnected, more than two supervertices may be left).
+        @param tails, heads edge endpoints (as lists)
+        @param rng random number generator (random module by default)
+        @returns number of crossing edges, side of each vertex
+                 (True if in the same partition as vertex 0)
+        """
+        uf = random_contraction(len(self.labels), tails, heads, 2, rng)
+        root = uf.find(0)
+        side = [uf.find(i) == root for i in range(len(self.labels))]
+        return self.count_cut(side, tails, heads), side
+    def karger_stein(self, nvtx, tails, heads, weights, chain=None, rng=random):
+        """Karger-Stein recursive contraction.
+        The graph is contracted down to ~nvtx/sqrt(2) supervertices
+        twice, independently, and each of the two contracted graphs
+        is processed recursively: the contracted prefix is shared
+        by the whole subtree below it. Graphs with at most 6
+        supervertices (the leaves) are solved exactly.
+        Parallel edges are merged into weighted edges at each step,
+        so the edge lists shrink together with the graphs.
+        @param nvtx number of (super)vertices of this graph
+        @param tails, heads edge endpoints (as lists of supervertex ids)
+        @param weights edge multiplicities (as a list)
+        @param chain relabelling of the supervertices done at each
+                     recursion step so far (as nested pairs
+                     (relabel, parent chain), None at the top)
+        @param rng random number generator (random module by default)
+        @returns generator over the leaves, yielding the number of
+                 crossing edges and the leaf as (chain, mask) pair,
+                 see get_leaf_side
+        """
+        if len(tails) == 0:
+            #Disconnected graph: nothing left to cut
+            yield 0, (chain, 1)
+            return
+        if nvtx <= 6:
+            #Try all the partitions
+            #(the last supervertex always stays on side 0)
+            edges = list(zip(tails, heads, weights))
+            best_cut = None
+            best_mask = 0
+            for mask in range(1, 2**(nvtx-1)):
+                cut = 0
+                for u, v, w in edges:
+                    if ((mask >> u) ^ (mask >> v)) & 1:
+                        cut += w
+                if best_cut is None or cut < best_cut:
+                    best_cut = cut
+                    best_mask = mask
+            yield best_cut, (chain, best_mask)
+            return
+        stop = int(ceil(1 + nvtx/sqrt(2)))
+        for branch in range(2):
+            uf = random_contraction(nvtx, tails, heads, stop, rng, weights)
+            compact = {}
+            relabel = []
+            for x in range(nvtx):
+                root = uf.find(x)
+                if root not in compact:
+                    compact[root] = len(compact)
+                relabel.append( compact[root] )
+            merged = {}
+            for u, v, w in zip(tails, heads, weights):
+                u = relabel[u]
+                v = relabel[v]
+                if u != v:
+                    key = (u, v) if u < v else (v, u)
+                    merged[key] = merged.get(key, 0) + w
+            sub_tails = [u for u, v in merged]
+            sub_heads = [v for u, v in merged]
+            for leaf in self.karger_stein(len(compact), sub_tails, sub_heads, list(merged.values()),
+                                          (relabel, chain), rng):
+                yield leaf
+    def get_leaf_side(self, chain, mask):
+        """Map a Karger-Stein leaf back to the original vertices.
+        @param chain relabelling chain of the leaf (see karger_stein)
+        @param mask bit mask of the leaf supervertices on side 1
+        @returns side of each vertex (True if in the same
+                 partition as vertex 0)
+        """
+        relabels = []
+        while chain is not None:
+            relabel, chain = chain
+            relabels.append( relabel )
+        relabels.reverse()
+        side = []
+        for x in range(len(self.labels)):
+            for relabel in relabels:
+                x = relabel[x]
+            side.append( (mask >> x) & 1 )
+        return [s == side[0] for s in side]
+    def contract_batch(self, seeds):
+        """Run a batch of Karger trials at once with NumPy.
+        Each trial visits the edges in a random order (see
+        random_contraction), drawn from its seed as an int32 argsort
+        of uniform keys. The union-find forests of all the trials
+        are stored side by side in flat arrays, and the k-th edge of
+        every trial still running is merged in one vectorized step.
+        Memory goes as batch size * (E + V).
+        @param seeds seed of each trial
+        @returns number of crossing edges (as array) and side of each
+                 vertex (as boolean array, one row per trial, True if
+                 in the same partition as vertex 0)
+        """
+        nvtx = len(self.labels)
+        nedges = len(self.tails)
+        ntrials = len(seeds)
+        order = np.empty((ntrials, nedges), dtype=np.int32)
+        for i, seed in enumerate(seeds):
+            rng = np.random.RandomState([seed & 0xffffffff, seed >> 32])
+            order[i] = np.argsort( rng.random_sample(nedges) )
+        offset = np.arange(ntrials, dtype=np.intp) * nvtx
+        parent = np.arange(ntrials*nvtx, dtype=np.intp)
+        size = np.ones(ntrials*nvtx, dtype=np.int32)
+        count = np.full(ntrials, nvtx, dtype=np.int32)
+        running = np.flatnonzero(count > 2)
+        for k in range(nedges):
+            if len(running) == 0:
+                break
+            edges = order[running, k]
+            roots = []
+            for x in (self.tails[edges] + offset[running], self.heads[edges] + offset[running]):
+                #Find with path halving
+                while True:
+                    p = parent[x]
+                    if (p == x).all():
+                        break
+                    parent[x] = parent[p]
+                    x = p
+                roots.append( x )
+            merge = roots[0] != roots[1]
+            if not merge.any():
+                continue
+            rx = roots[0][merge]
+            ry = roots[1][merge]
+            #Union by size
+            swap = size[rx] < size[ry]
+            big = np.where(swap, ry, rx)
+            small = np.where(swap, rx, ry)
+            parent[small] = big
+            size[big] += size[small]
+            count[running[merge]] -= 1
+            running = running[count[running] > 2]
+        #Final roots of all the vertices
+        while True:
+            p = parent[parent]
+            if (p == parent).all():
+                break
+            parent = p
+        roots = parent.reshape(ntrials, nvtx)
+        side = roots == roots[:, :1]
+        cuts = (side[:, self.tails] != side[:, self.heads]).sum(axis=1)
+        return cuts, side
+    def get_neighbour_counts(self):
+        """Weighted multigraph form of the graph: parallel edges
+        are stored once, with their multiplicity.
+        @returns for each vertex, a dictionary mapping each
+                 neighbour to the number of edges between them
+        """
+        counts = [ dict() for i in range(len(self.labels)) ]
+        for u, v in zip(self.tails.tolist(), self.heads.tolist()):
+            counts[u][v] = counts[u].get(v, 0) + 1
+            counts[v][u] = counts[v].get(u, 0) + 1
+        return counts
+    def contract_multigraph(self, counts, rng=random, walk=16):
+        """Run a single Karger trial on the weighted multigraph
+        (see get_neighbour_counts).
+        A random edge is drawn by picking one endpoint u with probability
+        proportional to its weighted degree (with a FenwickTree on the
+        degrees) and one of its neighbours v with probability proportional
+        to their multiplicity w(u,v). When the map of u is small, it is
+        walked; otherwise v is drawn as u, from the degrees, and accepted
+        with probability w(u,v)/degree(v): this takes about
+        total degree/degree(u) draws, so it is used only when that is
+        (walk times) smaller than the map.
+        Contracting (u, v) merges the smaller neighbour map into the larger
+        one and drops the self loop weight, so the maps only hold distinct
+        neighbours.
+        @param counts neighbour counts of each vertex (left untouched)
+        @param rng random number generator (random module by default)
+        @param walk relative cost of a FenwickTree draw and of a step
+               of the walk along a map
+        @returns number of crossing edges, side of each vertex
+                 (True if in the same partition as vertex 0)
+        """
+        nvtx = len(self.labels)
+        nbrs = [ dict(count) for count in counts ]
+        degree = [ sum(count.values()) for count in counts ]
+        degrees = FenwickTree(degree)
+        #Supervertex of each vertex: the one of its root
+        uf = UnionFind(nvtx)
+        owner = list(range(nvtx))
+        while uf.count > 2 and degrees.total > 0:
+            #Draw a random edge (u, v)
+            u = degrees.find( rng.random() * degrees.total )
+            nbrs_u = nbrs[u]
+            if len(nbrs_u) * degree[u] <= walk * degrees.total:
+                r = rng.random() * degree[u]
+                for v, w in nbrs_u.iteritems():
+                    r -= w
+                    if r < 0:
+                        break
+            else:
+                while True:
+                    v = degrees.find( rng.random() * degrees.total )
+                    w = nbrs_u.get(v, 0)
+                    if w and rng.random() * degree[v] < w:
+                        break
+            #Contract v into u (the one with more neighbours)
+            if len(nbrs[u]) < len(nbrs[v]):
+                u, v = v, u
+            nbrs_u = nbrs[u]
+            nbrs_v = nbrs[v]
+            w = nbrs_u.pop(v)
+            del nbrs_v[u]
+            get = nbrs_u.get
+            for x, c in nbrs_v.iteritems():
+                c += get(x, 0)
+                nbrs_u[x] = c
+                nbrs_x = nbrs[x]
+                del nbrs_x[v]
+                nbrs_x[u] = c
+            nbrs[v] = None
+            degrees.add(u, degree[v] - 2*w)
+            degrees.add(v, -degree[v])
+            degree[u] += degree[v] - 2*w
+            degree[v] = 0
+            uf.union(u, v)
+            owner[uf.find(u)] = u
+        #The supervertex containing vertex 0 is the first partition
+        root = uf.find(0)
+        side = [ uf.find(i) == root for i in range(nvtx) ]
+        return degree[owner[root]], side
+    def run_trials(self, backend, seeds, batch_size=64):
+        """Run independent trials of a backend working on the edge arrays.
+        Every trial uses its own random number generator, so
+        the outcome of a trial depends only on its seed.
+        @param backend 'unionfind', 'karger_stein', 'batch' or 'multigraph'
+        @param seeds seed of each trial
+        @param batch_size number of trials run together by 'batch'
+        @returns generator yielding, for each trial, the list of
+                 cuts found (one per recursive leaf for 'karger_stein')
+                 and the side of each vertex for the smallest one
+        """
+        if backend == 'batch':
+            for i in range(0, len(seeds), batch_size):
+                cuts, side = self.contract_batch(seeds[i:i+batch_size])
+                for cut, trial_side in zip(cuts, side):
+                    yield [int(cut)], trial_side
+            return
+        tails = self.tails.tolist()
+        heads = self.heads.tolist()
+        nvtx = len(self.labels)
+        if backend == 'multigraph':
+            counts = self.get_neighbour_counts()
+        for seed in seeds:
+            rng = random.Random(seed)
+            if backend == 'unionfind':
+                leaves = [ self.contract_unionfind(tails, heads, rng) ]
+            elif backend == 'multigraph':
+                leaves = [ self.contract_multigraph(counts, rng) ]
+            else:
+                leaves = self.karger_stein(nvtx, tails, heads, [1]*len(tails), rng=rng)
+            cuts = []
+            best_side = None
+            for cut, side in leaves:
+                if not cuts or cut < best_cut:
+                    best_cut = cut
+                    best_side = side if backend != 'karger_stein' else self.get_leaf_side(*side)
+                cuts.append( cut )
+            yield cuts, best_side
+    def run_parallel(self, backend, seeds, workers, batch_size=64):
+        """Spread the trials of run_trials over a pool of processes.
+        The edge arrays are sent once to each worker, then the seeds
+        are dispatched in chunks; results come back in trial order.
+        @param backend 'unionfind', 'karger_stein', 'batch' or 'multigraph'
+        @param seeds seed of each trial
+        @param workers number of processes
+        @param batch_size number of trials run together by 'batch'
+        @returns generator with the same output as run_trials
+        """
+        chunk = max(1, int(ceil( len(seeds) / (4.*workers) )))
+        chunks = [ (backend, seeds[i:i+chunk], batch_size) for i in range(0, len(seeds), chunk) ]
+        pool = multiprocessing.Pool(workers, initializer=init_worker,
+                                    initargs=(self.labels, self.tails, self.heads))
+        try:
+            for results in pool.imap(run_worker_trials, chunks):
+                for result in results:
+                    yield result
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+    def get_success_prob(self, backend):
+        """Lower bound of the probability that a single trial
+        finds a minimum cut: 2/(n*(n-1)) for a Karger contraction,
+        1/(depth+1) for a Karger-Stein run (see get_karger_stein_depth).
+        @param backend see find_min_cut
+        @returns probability
+        """
+        nvtx = len(self.labels)
+        if nvtx < 3:
+            return 1.
+        if backend == 'karger_stein':
+            return 1./(get_karger_stein_depth(nvtx)+1)
+        return 2./(nvtx*(nvtx-1))
+    def is_converged(self, ntrials, stale, patience, tolerance, prob):
+        """Adaptive stopping rule of find_min_cut.
+        @param ntrials number of trials done
+        @param stale number of trials since the last improvement
+        @param patience stop after this many trials without improvement
+                        (None to disable)
+        @param tolerance stop when the probability that no trial found
+                         a minimum cut, (1 - prob)^ntrials, is below it
+                         (None to disable)
+        @param prob success probability of a trial (see get_success_prob)
+        @returns True if no more trials are needed
+        """
+        if patience is not None and stale >= patience:
+            return True
+        if tolerance is not None and (1.-prob)**ntrials < tolerance:
+            return True
+        return False
+    def find_min_cut(self, ncalls=-1, debug=False, backend='contraction', workers=1, seed=None,
+                     batch_size=64, patience=None, tolerance=None):
         """Find the minimum number of cuts using the Karger algorithm.
         @param ncalls number of iterations. The probability P that
                       the minimum number of cuts is NOT found
@@ -99,6 +726,39 @@ class Graph(object):
                       so that P<=1/nvtx^2
                       (this is a quite time-consuming requirement)
         @param debug print out some debug information
+        @param backend contraction engine:
+               'contraction'  -> contract Vertex objects on a deep copy
+                                 of the graph (default)
+               'unionfind'    -> contract the flat edge arrays with a
+                                 union-find structure, no copy of the
+                                 graph is needed (~O(E) per trial)
+               'karger_stein' -> recursive contraction, see karger_stein.
+                                 ncalls is the number of independent
+                                 recursive runs (default log(nvtx)^2, so
+                                 that again P<=1/nvtx), and min_cuts
+                                 gets one entry per recursive leaf
+               'batch'        -> the 'unionfind' contraction vectorized
+                                 with NumPy over batches of trials,
+                                 see contract_batch
+               'multigraph'   -> contract a weighted multigraph, storing
+                                 parallel edges as multiplicities,
+                                 see contract_multigraph
+        @param workers number of processes running the trials
+               (all backends but 'contraction')
+        @param seed master seed (all backends but 'contraction'):
+               each trial gets its own random number generator, seeded
+               from it, so that the results do not depend on workers
+               (nor on batch_size). By default it is drawn from the
+               random module
+        @param batch_size number of trials run together by 'batch'
+        @param patience stop early if the minimum cut did not improve
+               for this many trials (Karger-Stein runs)
+        @param tolerance stop early once the bound on the probability
+               that the minimum cut was NOT found, (1 - p)^trials, is
+               below tolerance (see get_success_prob for p).
+               Both patience and tolerance are off by default: ncalls
+               trials are then run. Otherwise ncalls is just the budget,
+               and the search stops as soon as one of them is satisfied
         @returns the minimum number of cuts, two possible partitions
                  realising that (as lists of vertex indices)
         """
@@ -106,15 +766,62 @@ class Graph(object):
         cutA = []
         cutB = []
         if ncalls < 0:
-            #Take n^2*log(n) by default to have the probability
-            #of finding at least one min cut as P = 1 - 1/n
-            ncalls = int(len(self.adjlist)**2 * log( len(self.adjlist) ))
+            if backend == 'karger_stein':
+                #Each run finds a min cut with probability ~1/log(n)
+                ncalls = int(ceil(log( len(self.labels) )**2))
+            else:
+                #Take n^2*log(n) by default to have the probability
+                #of finding at least one min cut as P = 1 - 1/n
+                ncalls = int(len(self.labels)**2 * log( len(self.labels) ))
         if debug:
             print "[DEBUG] Graph.find_min_cut(...): number of iterations "+str(ncalls)
+        prob = self.get_success_prob(backend)
+        if backend in ('unionfind', 'karger_stein', 'batch', 'multigraph'):
+            if seed is None:
+                seed = random.getrandbits(64)
+            master = random.Random(seed)
+            seeds = [ master.getrandbits(64) for i in range(ncalls) ]
+            if workers > 1:
+                trials = self.run_parallel(backend, seeds, workers, batch_size)
+            else:
+                trials = self.run_trials(backend, seeds, batch_size)
+            min_cut = None
+            best_side = None
+            self.nleaves = 0
+            stale = 0
+            for i, (cuts, side) in enumerate(trials):
+                if debug and i%50 == 0:
+                    print "[DEBUG] Graph.find_min_cut(...): ...iteration "+str(i)
+                self.nleaves += len(cuts)
+                stale += 1
+                for this_min in cuts:
+                    if min_cut is None or this_min < min_cut:
+                        min_cut = this_min
+                        best_side = side
+                        stale = 0
+                    self.min_cuts.append( min_cut )
+                if self.is_converged(i+1, stale, patience, tolerance, prob):
+                    if debug:
+                        print "[DEBUG] Graph.find_min_cut(...): converged after "+str(i+1)+" iterations"
+                    break
+            trials.close()
+            if debug and backend == 'karger_stein':
+                print "[DEBUG] Graph.find_min_cut(...): explored "+str(self.nleaves)+" recursive leaves"
+            if best_side is not None:
+                cutA, cutB = self.get_partitions(best_side)
+            return min_cut, cutA, cutB
+        elif backend != 'contraction':
+            raise ValueError("Unknown backend '%s'" % backend)
+        if workers > 1:
+            raise ValueError("The 'contraction' backend runs on a single process")
+        if len(self.adjlist) != len(self.labels):
+            raise ValueError("The 'contraction' backend needs the Vertex objects (see add_vertices)")
+        stale = 0
         for i in range(ncalls):
             if debug and i%50 == 0:
                 print "[DEBUG] Graph.find_min_cut(...): ...iteration "+str(i)
             thisgraph = self.clone()
+            stale += 1
             while( len(thisgraph.adjlist)>2 ):
                 #Get random pair of connected vertices
                 vtx1, vtx2 = thisgraph.get_random_edge()
@@ -127,8 +834,25 @@ class Graph(object):
                         min_cut = this_min
                         cutA = thisgraph.adjlist[0].v
                         cutB = thisgraph.adjlist[1].v
+                        stale = 0
                     self.min_cuts.append( min_cut )
             del thisgraph
+            if self.is_converged(i+1, stale, patience, tolerance, prob):
+                if debug:
+                    print "[DEBUG] Graph.find_min_cut(...): converged after "+str(i+1)+" iterations"
+                break
+        return min_cut, cutA, cutB
+    def find_exact_min_cut(self, debug=False):
+        """Find the minimum number of cuts with the (deterministic)
+        Stoer-Wagner algorithm, see stoer_wagner.
+        @param debug print out some debug information
+        @returns the minimum number of cuts, two possible partitions
+                 realising that (as lists of vertex indices)
+        """
+        if debug:
+            print "[DEBUG] Graph.find_exact_min_cut(...): "+str(len(self.labels))+" vertices, "+str(len(self.tails))+" edges"
+        min_cut, side = stoer_wagner(len(self.labels), self.tails.tolist(), self.heads.tolist())
+        cutA, cutB = self.get_partitions(side)
         return min_cut, cutA, cutB
     def plot_convergence(self, title):
         """Plot the minimum number of cuts
@@ -141,7 +865,64 @@ class Graph(object):
         """
         fig = plt.figure()
         ax = fig.add_subplot(111)
-        plt.plot(self.min_cuts)
+        history = self.min_cuts
+        if len(history):
+            #Draw the improvements as steps, up to the last iteration
+            plt.step(history.trials + [len(history)-1],
+                     history.values + [history.values[-1]], where='post')
         plt.xlabel('iteration')
         plt.ylabel('min cut found')
         fig.savefig(title)
+
+def find_exact_min_cut(adjlist):
+    """Stoer-Wagner minimum cut of a graph given as adjacency list.
+    @param adjlist adjacency list, as in Graph(adjlist=adjlist)
+    @returns the minimum number of cuts, two possible partitions
+             realising that (as lists of vertex indices)
+    """
+    return Graph(adjlist=adjlist).find_exact_min_cut()
+
+def planted_cut_graph(nvtx, degree, ncross, seed=None):
+    """Generate a random graph with a known minimum cut:
+    two random clusters of nvtx/2 vertices, where every vertex
+    is connected to (at least) degree others of its own cluster,
+    joined by ncross random edges. If ncross < degree, the cut
+    between the two clusters is the minimum one.
+    @param nvtx number of vertices (labelled from 1)
+    @param degree minimum number of neighbours inside the cluster
+    @param ncross number of edges between the clusters
+    @param seed seed for the random generation
+    @returns adjacency list, as in Graph(adjlist=adjlist)
+    """
+    rng = random.Random(seed)
+    half = nvtx // 2
+    clusters = [ list(range(1, half+1)), list(range(half+1, nvtx+1)) ]
+    edges = set()
+    for cluster in clusters:
+        for v in cluster:
+            neighbours = rng.sample(cluster, min(degree+1, len(cluster)))
+            for u in neighbours:
+                if u != v:
+                    edges.add( (min(u, v), max(u, v)) )
+    while ncross > 0:
+        u = rng.choice(clusters[0])
+        v = rng.choice(clusters[1])
+        if (u, v) not in edges:
+            edges.add( (u, v) )
+            ncross -= 1
+    adjlist = [ [v] for v in range(1, nvtx+1) ]
+    for u, v in sorted(edges):
+        adjlist[u-1].append( v )
+        adjlist[v-1].append( u )
+    return adjlist
+
+#Graph shipped once to each worker process by Graph.run_parallel
+worker_graph = None
+
+def init_worker(labels, tails, heads):
+    global worker_graph
+    worker_graph = Graph.from_edges(labels, tails, heads)
+
+def run_worker_trials(args):
+    backend, seeds, batch_size = args
+    return list( worker_graph.run_trials(backend, seeds, batch_size) )
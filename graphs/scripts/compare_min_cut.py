@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+import os, sys
+import time
+
+sys.path.append("../python")
+from karger import Graph, planted_cut_graph
+
+def compare(name, adjlist, ncalls=100):
+    """Cross-check (and time) the Karger and the
+    Stoer-Wagner minimum cut on the same graph.
+    @param name graph name (for printing)
+    @param adjlist adjacency list of the graph
+    @param ncalls number of Karger trials
+    """
+    graph = Graph( adjlist = adjlist )
+    print "Graph "+name+": "+str(len(graph.labels))+" vertices, "+str(len(graph.tails))+" edges"
+    start = time.time()
+    karger_cut, _, _ = graph.find_min_cut(ncalls=ncalls, backend='unionfind', seed=42)
+    karger_time = time.time() - start
+    start = time.time()
+    exact_cut, _, _ = graph.find_exact_min_cut()
+    exact_time = time.time() - start
+    print "Karger (%d trials): %d (%.2f s)" % (ncalls, karger_cut, karger_time)
+    print "Stoer-Wagner: %d (%.2f s)" % (exact_cut, exact_time)
+    if karger_cut != exact_cut:
+        print "Warning: Karger did not find the minimum cut!"
+
+if __name__ == "__main__":
+
+    adjlist = []
+    with open("../data/kargerMinCut.txt","r") as file:
+        for line in file:
+            adjlist.append( [int(x) for x in line.split() ] )
+    compare("kargerMinCut.txt", adjlist)
+
+    for nvtx in [200, 500]:
+        print ""
+        compare("planted cut (min cut 5)", planted_cut_graph(nvtx, 8, 5, seed=nvtx))
@@ -1,8 +1,10 @@
 #!/usr/bin/env python
 import os, sys
+import multiprocessing
 
 sys.path.append("../python")
 from karger import Graph
+from graph_io import load_graph
 
 if __name__ == "__main__":
 
@@ -19,12 +21,10 @@ if __name__ == "__main__":
 
     print ""
     print "Find minimum cut for graph defined in kargerMinCut.txt:"
-    adjlist = []
-    with open("../data/kargerMinCut.txt","r") as file:
-        for line in file:
-            adjlist.append( [int(x) for x in line.split() ] )
-    graph = Graph( adjlist = adjlist )
-    min_cut, cutA, cutB = graph.find_min_cut(ncalls=1000, debug=True)
+    graph = Graph.from_csr( load_graph("../data/kargerMinCut.txt") )
+    min_cut, cutA, cutB = graph.find_min_cut(ncalls=1000, debug=True, backend='unionfind',
+                                           workers=multiprocessing.cpu_count(), seed=42,
+                                           patience=200)
     print "Minimum cut: "+str(min_cut)
     print "First subgraph:"
     print cutA
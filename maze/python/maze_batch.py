@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+import os
+import struct
+import time
+import multiprocessing
+import numpy as np
+from maze_utils import Maze, GridSearch, PackedWalls
+
+#Binary maze file format:
+#the file starts with MAGIC, then each maze is stored as a record
+#made of a header of six little-endian int32
+#    height, width, start x, start y, end x, end y
+#(-1 for the default start/end, see Maze) followed by the walls
+#bit-packed row by row (numpy.packbits, ceil(height*width/8) bytes).
+MAGIC = b'MAZ1'
+HEADER = struct.Struct('<6i')
+
+def encode_maze(maze, start=None, end=None):
+    """Convert a maze into a binary record.
+    @param maze nested N*M list (or array), see Maze
+    @param start grid starting point x,y tuple (None for the default)
+    @param end grid ending point x,y tuple (None for the default)
+    @returns record (as bytes)
+    """
+    walls = np.asarray(maze) == 1
+    if walls.ndim != 2:
+        raise ValueError("The input maze has to be 2-dimensional")
+    start = (-1, -1) if start is None else start
+    end = (-1, -1) if end is None else end
+    header = HEADER.pack(walls.shape[0], walls.shape[1], start[0], start[1], end[0], end[1])
+    return header + np.packbits(walls).tobytes()
+
+def decode_maze(record):
+    """Convert a binary record back into a maze.
+    @param record record (as bytes), see encode_maze
+    @returns walls (as N*M array of 0's and 1's), start and end
+    """
+    height, width, sx, sy, ex, ey = HEADER.unpack_from(record)
+    bits = np.frombuffer(record, dtype=np.uint8, offset=HEADER.size)
+    walls = np.unpackbits(bits)[:height*width].reshape(height, width)
+    start = None if sx < 0 else (sx, sy)
+    end = None if ex < 0 else (ex, ey)
+    return walls, start, end
+
+def write_mazes(filename, mazes):
+    """Write many mazes in a binary file.
+    @param filename output file name
+    @param mazes iterable of (maze, start, end) tuples
+    """
+    with open(filename, 'wb') as file:
+        file.write(MAGIC)
+        for maze, start, end in mazes:
+            file.write(encode_maze(maze, start, end))
+
+def read_records(filename):
+    """Read the binary records of a maze file one by one.
+    @param filename input file name
+    @returns generator over the records (as bytes)
+    """
+    with open(filename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a maze file" % filename)
+        while True:
+            header = file.read(HEADER.size)
+            if not header:
+                break
+            if len(header) < HEADER.size:
+                raise ValueError("Truncated maze file %s" % filename)
+            height, width = HEADER.unpack(header)[:2]
+            nbytes = (height*width + 7) // 8
+            yield header + file.read(nbytes)
+
+def read_mazes(filename):
+    """Read the mazes of a maze file one by one.
+    @param filename input file name
+    @returns generator over the (walls, start, end) tuples
+    """
+    for record in read_records(filename):
+        yield decode_maze(record)
+
+def map_mazes(filename):
+    """Memory-map the mazes of a maze file one by one: only the
+    headers are read, the walls stay on disk (see PackedWalls).
+    @param filename input file name
+    @returns generator over the (walls, start, end) tuples,
+             with the walls as PackedWalls
+    """
+    size = os.path.getsize(filename)
+    offset = len(MAGIC)
+    with open(filename, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("%s is not a maze file" % filename)
+        while offset < size:
+            file.seek(offset)
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                raise ValueError("Truncated maze file %s" % filename)
+            height, width, sx, sy, ex, ey = HEADER.unpack(header)
+            offset += HEADER.size
+            nbytes = (height*width + 7) // 8
+            if offset + nbytes > size:
+                raise ValueError("Truncated maze file %s" % filename)
+            walls = PackedWalls.load(filename, height, width, offset)
+            offset += nbytes
+            yield walls, (None if sx < 0 else (sx, sy)), (None if ex < 0 else (ex, ey))
+
+def solve_record(args):
+    """Solve the maze of a binary record (no plot).
+    @param args index of the maze, record and backend (see Maze.solve)
+    @returns index, path length, number of expanded cells
+             and solving time (in seconds)
+    """
+    index, record, backend = args
+    walls, start, end = decode_maze(record)
+    start_time = time.time()
+    maze = Maze(walls, start, end)
+    search = GridSearch(maze.walls)
+    solver = search.jps if backend == 'jps' else search.astar
+    _, pathlen = solver((maze.start.x, maze.start.y), (maze.end.x, maze.end.y))
+    return index, pathlen, search.expanded, time.time() - start_time
+
+def solve_batch(filename, workers=None, backend='array'):
+    """Solve all the mazes of a maze file over a pool of processes.
+    The mazes are sent to the workers still bit-packed, one at a
+    time, and the results are returned as soon as they are ready,
+    so a slow maze does not hold back the others.
+    @param filename input maze file
+    @param workers number of processes (default: number of CPUs,
+           1 to solve the mazes in this process)
+    @param backend 'array' (A*) or 'jps', see Maze.solve
+    @returns generator over the results, in order of completion:
+             (index of the maze in the file, path length (0 if there
+             is no path), number of expanded cells, solving time)
+    """
+    if backend not in ('array', 'jps'):
+        raise ValueError("Unknown backend '%s'" % backend)
+    tasks = ( (index, record, backend) for index, record in enumerate(read_records(filename)) )
+    if workers is None:
+        workers = multiprocessing.cpu_count()
+    if workers == 1:
+        for task in tasks:
+            yield solve_record(task)
+        return
+    pool = multiprocessing.Pool(workers)
+    try:
+        for result in pool.imap_unordered(solve_record, tasks):
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
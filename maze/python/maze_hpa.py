@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+import heapq
+from collections import deque
+import numpy as np
+from maze_utils import get_walls, PackedWalls
+
+class HierarchicalSearch(object):
+    """
+    Implements hierarchical path-finding (HPA*) on a N*M grid.
+
+    The grid is split in square clusters of cluster*cluster cells.
+    Along the border of two adjacent clusters, every run of cells that
+    are free on both sides gets one entrance (a pair of adjacent cells,
+    in the middle of the run). The entrance cells are the nodes of an
+    abstract graph, connected by the entrances themselves (cost 1) and,
+    inside each cluster, by the BFS distances between its nodes.
+
+    A query connects the start and the end to the nodes of their
+    clusters, runs A* on the abstract graph and refines the result
+    cluster by cluster into a path of cells. Paths exist exactly when
+    they exist in the grid, but they can be slightly longer than the
+    shortest ones (they cross the borders at the entrances only).
+
+    The abstraction can be saved and loaded (see save), and it is
+    updated cluster by cluster when some walls change (see update).
+    """
+    def __init__(self, walls, cluster=32, build=True):
+        """Prepare (and by default build) the abstraction.
+        @param walls N*M array (or nested list) of booleans,
+               True for the walls, or PackedWalls (read band by band)
+        @param cluster size of the clusters (in cells)
+        @param build build the abstraction (False to fill it
+               afterwards, see load)
+        """
+        if isinstance(walls, PackedWalls):
+            self.source = walls
+        else:
+            self.source = get_walls(walls)
+        self.grid_height, self.grid_width = self.source.shape
+        self.cluster = cluster
+        self.ncx = (self.grid_width + cluster - 1) // cluster
+        self.ncy = (self.grid_height + cluster - 1) // cluster
+        # cells whose wall has been flipped with respect to the source
+        self.flipped = set()
+        # entrances: (c1, c2) -> list of (cell of c1, cell of c2),
+        # with c2 the cluster right of or below c1
+        self.borders = {}
+        # entrance partners of each node
+        self.inter = {}
+        # cluster -> node -> list of (node, distance) in the cluster
+        self.intra = {}
+        self.expanded = 0
+        if build:
+            self.build()
+
+    def get_cluster(self, cell):
+        y, x = divmod(cell, self.grid_width)
+        return (y // self.cluster) * self.ncx + x // self.cluster
+
+    def get_bounds(self, c):
+        """Cells of a cluster.
+        @returns y0, y1, x0, x1 (rows [y0, y1), columns [x0, x1))
+        """
+        cy, cx = divmod(c, self.ncx)
+        y0 = cy * self.cluster
+        x0 = cx * self.cluster
+        return y0, min(y0 + self.cluster, self.grid_height), \
+               x0, min(x0 + self.cluster, self.grid_width)
+
+    def get_rows(self, y0, y1):
+        """Walls of a block of rows, with the flipped cells.
+        @returns (y1-y0)*M boolean array, True for the walls
+        """
+        if isinstance(self.source, PackedWalls):
+            rows = self.source.unpack(y0, y1)
+        else:
+            rows = self.source[y0:y1].copy()
+        for cell in self.flipped:
+            y, x = divmod(cell, self.grid_width)
+            if y0 <= y < y1:
+                rows[y - y0, x] = not rows[y - y0, x]
+        return rows
+
+    def get_block(self, c):
+        y0, y1, x0, x1 = self.get_bounds(c)
+        return self.get_rows(y0, y1)[:, x0:x1]
+
+    def set_border(self, c1, c2, pairs):
+        """Replace the entrances between two clusters.
+        @returns True if they changed
+        """
+        old = self.borders.get((c1, c2), [])
+        if old == pairs:
+            return False
+        for a, b in old:
+            self.inter[a].discard(b)
+            self.inter[b].discard(a)
+        for a, b in pairs:
+            self.inter.setdefault(a, set()).add(b)
+            self.inter.setdefault(b, set()).add(a)
+        if pairs:
+            self.borders[(c1, c2)] = pairs
+        else:
+            self.borders.pop((c1, c2), None)
+        return True
+
+    def get_entrances(self, side1, side2):
+        """Middle of the runs of cells free on both sides of a border.
+        @param side1,side2 boolean arrays of the walls along the border
+        @returns positions along the border (as array)
+        """
+        free = np.concatenate(([0], (~side1 & ~side2).astype(np.int8), [0]))
+        edges = np.diff(free)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        return (starts + ends - 1) // 2
+
+    def build_borders(self, cy, rows):
+        """Find the entrances of the clusters of a band: the borders
+        with the cluster on the right and with the cluster below.
+        @param cy band (row of clusters)
+        @param rows walls of the band, plus the first row
+               of the next band (if any)
+        @returns set of the clusters whose entrances changed
+        """
+        width = self.grid_width
+        y0 = cy * self.cluster
+        y1 = min(y0 + self.cluster, self.grid_height)
+        changed = set()
+        for cx in range(self.ncx):
+            c = cy * self.ncx + cx
+            x0 = cx * self.cluster
+            x1 = min(x0 + self.cluster, width)
+            if cx + 1 < self.ncx:
+                pos = self.get_entrances(rows[:y1-y0, x1-1], rows[:y1-y0, x1]) + y0
+                pairs = zip((pos * width + x1 - 1).tolist(), (pos * width + x1).tolist())
+                if self.set_border(c, c + 1, pairs):
+                    changed.update((c, c + 1))
+            if cy + 1 < self.ncy:
+                pos = self.get_entrances(rows[y1-y0-1, x0:x1], rows[y1-y0, x0:x1]) + x0
+                pairs = zip(((y1 - 1) * width + pos).tolist(), (y1 * width + pos).tolist())
+                if self.set_border(c, c + self.ncx, pairs):
+                    changed.update((c, c + self.ncx))
+        return changed
+
+    def get_nodes(self, c):
+        """Entrance cells of a cluster (sorted)."""
+        cy, cx = divmod(c, self.ncx)
+        nodes = set()
+        for key, side in (((c - 1, c), 1), ((c, c + 1), 0),
+                          ((c - self.ncx, c), 1), ((c, c + self.ncx), 0)):
+            nodes.update( pair[side] for pair in self.borders.get(key, ()) )
+        return sorted(nodes)
+
+    def search_cluster(self, c, block, first):
+        """BFS from a cell, without leaving its cluster.
+        @param c cluster
+        @param block walls of the cluster (see get_block)
+        @param first starting cell (global index)
+        @returns distance and parent (local indices, -1 for the
+                 unreached cells) lists over the cells of the cluster
+        """
+        y0, y1, x0, x1 = self.get_bounds(c)
+        bw = x1 - x0
+        bh = y1 - y0
+        free = (~block).ravel().tolist()
+        dist = [-1] * (bh * bw)
+        parent = [-1] * (bh * bw)
+        start = self.to_local(c, first)
+        dist[start] = 0
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            y, x = divmod(cell, bw)
+            d = dist[cell] + 1
+            for adj, ax, ay in ((cell+1, x+1, y), (cell-bw, x, y-1),
+                                (cell-1, x-1, y), (cell+bw, x, y+1)):
+                if 0 <= ax < bw and 0 <= ay < bh and free[adj] and dist[adj] < 0:
+                    dist[adj] = d
+                    parent[adj] = cell
+                    queue.append(adj)
+        return dist, parent
+
+    def to_local(self, c, cell):
+        y0, y1, x0, x1 = self.get_bounds(c)
+        y, x = divmod(cell, self.grid_width)
+        return (y - y0) * (x1 - x0) + x - x0
+
+    def get_distances(self, c, block, nodes):
+        """BFS distances between the nodes of a cluster, without
+        leaving it. The searches from (up to 64) nodes advance
+        together one level at a time: each cell holds a 64-bit mask
+        of the searches that reached it, and a level is a few
+        vectorized operations on these masks.
+        @param c cluster
+        @param block walls of the cluster (see get_block)
+        @param nodes cells (global indices)
+        @returns len(nodes)*len(nodes) int32 array of distances
+                 (-1 for the unreachable pairs)
+        """
+        free = ~block
+        local = np.array([ self.to_local(c, node) for node in nodes ], dtype=np.intp)
+        dist = np.full((len(nodes), len(nodes)), -1, dtype=np.int32)
+        for first in range(0, len(nodes), 64):
+            group = local[first:first+64]
+            bits = np.left_shift(np.uint64(1), np.arange(len(group), dtype=np.uint64))
+            reached = np.zeros(block.shape, dtype=np.uint64)
+            reached.ravel()[group] = bits
+            frontier = reached.copy()
+            dist[first + np.arange(len(group)), np.arange(len(group)) + first] = 0
+            level = 0
+            while frontier.any():
+                level += 1
+                grow = np.zeros_like(frontier)
+                grow[:, 1:] |= frontier[:, :-1]
+                grow[:, :-1] |= frontier[:, 1:]
+                grow[1:, :] |= frontier[:-1, :]
+                grow[:-1, :] |= frontier[1:, :]
+                grow[~free] = 0
+                frontier = grow & ~reached
+                reached |= frontier
+                # searches reaching the nodes at this level
+                hits = frontier.ravel()[local]
+                if hits.any():
+                    found = (hits[:, None] & bits[None, :]) != 0
+                    dist[first:first+len(group)][found.T] = level
+        return dist
+
+    def build_cluster(self, c, block):
+        """Compute the distances between the nodes of a cluster.
+        @param c cluster
+        @param block walls of the cluster (see get_block)
+        """
+        nodes = self.get_nodes(c)
+        edges = {}
+        if nodes:
+            dist = self.get_distances(c, block, nodes).tolist()
+            for i, node in enumerate(nodes):
+                others = [ (other, d) for other, d in zip(nodes, dist[i])
+                           if other != node and d >= 0 ]
+                if others:
+                    edges[node] = others
+        if edges:
+            self.intra[c] = edges
+        else:
+            self.intra.pop(c, None)
+
+    def build(self):
+        """Build the whole abstraction, reading the walls band by band."""
+        self.borders = {}
+        self.inter = {}
+        self.intra = {}
+        for cy in range(self.ncy):
+            y0 = cy * self.cluster
+            self.build_borders(cy, self.get_rows(y0, min(y0 + self.cluster + 1, self.grid_height)))
+        for cy in range(self.ncy):
+            y0 = cy * self.cluster
+            rows = self.get_rows(y0, min(y0 + self.cluster, self.grid_height))
+            for cx in range(self.ncx):
+                x0 = cx * self.cluster
+                self.build_cluster(cy * self.ncx + cx, rows[:, x0:x0 + self.cluster])
+
+    def update(self, cells):
+        """Flip the walls of some cells and update the abstraction:
+        only the bands of clusters containing them are scanned for
+        entrances, and only the clusters whose cells or entrances
+        changed are rebuilt.
+        @param cells list of x,y tuples of the cells that turned
+               into walls or were cleared
+        """
+        bands = set()
+        dirty = set()
+        for x, y in cells:
+            if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+                raise ValueError("Cell (%d,%d) is outside the maze" % (x, y))
+            cell = int(y) * self.grid_width + int(x)
+            self.flipped.symmetric_difference_update([cell])
+            dirty.add(self.get_cluster(cell))
+            cy = y // self.cluster
+            bands.add(cy)
+            if y % self.cluster == 0 and cy > 0:
+                # border with the band above
+                bands.add(cy - 1)
+        for cy in bands:
+            y0 = cy * self.cluster
+            dirty |= self.build_borders(cy, self.get_rows(y0, min(y0 + self.cluster + 1, self.grid_height)))
+        for c in dirty:
+            self.build_cluster(c, self.get_block(c))
+
+    def save(self, filename):
+        """Write the abstraction in numpy (.npz) format
+        (the walls are not saved, see load).
+        @param filename output file name
+        """
+        keys = sorted(self.borders)
+        pairs = [ pair for key in keys for pair in self.borders[key] ]
+        src, dst, cost = [], [], []
+        for c in sorted(self.intra):
+            for node, edges in sorted(self.intra[c].items()):
+                for other, dist in edges:
+                    src.append(node)
+                    dst.append(other)
+                    cost.append(dist)
+        np.savez(filename,
+                 shape=np.array([self.grid_height, self.grid_width, self.cluster], dtype=np.int64),
+                 keys=np.array(keys, dtype=np.int64).reshape(-1, 2),
+                 counts=np.array([ len(self.borders[key]) for key in keys ], dtype=np.int64),
+                 pairs=np.array(pairs, dtype=np.int64).reshape(-1, 2),
+                 src=np.array(src, dtype=np.int64),
+                 dst=np.array(dst, dtype=np.int64),
+                 cost=np.array(cost, dtype=np.int64),
+                 flipped=np.array(sorted(self.flipped), dtype=np.int64))
+
+    @classmethod
+    def load(cls, filename, walls):
+        """Read an abstraction written by save.
+        @param filename input file name
+        @param walls walls it was built from (see __init__)
+        @returns the search object
+        """
+        data = np.load(filename)
+        height, width, cluster = data['shape'].tolist()
+        search = cls(walls, cluster, build=False)
+        if (search.grid_height, search.grid_width) != (height, width):
+            raise ValueError("The abstraction was built for a %dx%d maze" % (height, width))
+        search.flipped = set(data['flipped'].tolist())
+        pairs = [ tuple(pair) for pair in data['pairs'].tolist() ]
+        first = 0
+        for (c1, c2), count in zip(data['keys'].tolist(), data['counts'].tolist()):
+            search.set_border(c1, c2, pairs[first:first + count])
+            first += count
+        for node, other, dist in zip(data['src'].tolist(), data['dst'].tolist(),
+                                     data['cost'].tolist()):
+            edges = search.intra.setdefault(search.get_cluster(node), {})
+            edges.setdefault(node, []).append((other, dist))
+        return search
+
+    def connect(self, c, block, cell, end=None):
+        """Distances from a cell to the nodes of its cluster.
+        @param end ending cell, also connected if in the same cluster
+        @returns list of (node, distance)
+        """
+        dist, _ = self.search_cluster(c, block, cell)
+        targets = self.get_nodes(c)
+        if end is not None and self.get_cluster(end) == c:
+            targets.append(end)
+        return [ (node, dist[self.to_local(c, node)]) for node in targets
+                 if node != cell and dist[self.to_local(c, node)] >= 0 ]
+
+    def refine(self, points):
+        """Expand a path of abstract nodes cell by cell.
+        @param points list of cells (global indices)
+        @returns path as list of (x,y) tuples
+        """
+        width = self.grid_width
+        blocks = {}
+        cells = points[:1]
+        for u, v in zip(points[:-1], points[1:]):
+            c = self.get_cluster(u)
+            if c != self.get_cluster(v):
+                # entrance between two clusters
+                cells.append(v)
+                continue
+            if c not in blocks:
+                blocks[c] = self.get_block(c)
+            _, parent = self.search_cluster(c, blocks[c], v)
+            y0, y1, x0, x1 = self.get_bounds(c)
+            cell = parent[self.to_local(c, u)]
+            while cell != -1:
+                y, x = divmod(cell, x1 - x0)
+                cells.append((y + y0) * width + x + x0)
+                cell = parent[cell]
+        return [ (cell % width, cell // width) for cell in cells ]
+
+    def solve(self, start, end):
+        """Find a path between two cells.
+        @param start starting cell x,y tuple
+        @param end ending cell x,y tuple
+        @returns path (or None if not found) and its lenght,
+                 the number of expanded abstract nodes is in expanded
+        """
+        width = self.grid_width
+        self.expanded = 0
+        cells = []
+        for (x, y), name in ((start, 'start'), (end, 'stop')):
+            if not (0 <= x < width and 0 <= y < self.grid_height):
+                raise ValueError("The %s is outside the maze" % name)
+            cells.append(int(y) * width + int(x))
+        first, last = cells
+        cs = self.get_cluster(first)
+        ce = self.get_cluster(last)
+        block = self.get_block(cs)
+        end_block = block if ce == cs else self.get_block(ce)
+        if block.ravel()[self.to_local(cs, first)] or end_block.ravel()[self.to_local(ce, last)]:
+            raise ValueError("You can't assign the start or the stop to a cell with a wall")
+        if first == last:
+            return [tuple(start)], 1
+        start_edges = self.connect(cs, block, first, last)
+        # distances are symmetric: edges towards the end
+        end_edges = dict(self.connect(ce, end_block, last))
+        ex, ey = end
+        g = {first: 0}
+        parent = {first: -1}
+        closed = set()
+        h = abs(start[0] - ex) + abs(start[1] - ey)
+        opened = [(h, h, first)]
+        while opened:
+            f, h, node = heapq.heappop(opened)
+            if node in closed:
+                continue
+            closed.add(node)
+            self.expanded += 1
+            if node == last:
+                points = []
+                while node != -1:
+                    points.append(node)
+                    node = parent[node]
+                points.reverse()
+                path = self.refine(points)
+                return path, len(path)
+            if node == first:
+                edges = list(start_edges)
+            else:
+                edges = self.intra.get(self.get_cluster(node), {}).get(node, [])
+            edges = edges + [ (other, 1) for other in self.inter.get(node, ()) ]
+            if node in end_edges:
+                edges.append((last, end_edges[node]))
+            for other, dist in edges:
+                cost = g[node] + dist
+                if other not in closed and cost < g.get(other, cost + 1):
+                    g[other] = cost
+                    parent[other] = node
+                    y, x = divmod(other, width)
+                    h = abs(x - ex) + abs(y - ey)
+                    heapq.heappush(opened, (cost + h, h, other))
+        return None, 0
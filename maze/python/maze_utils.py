@@ -1,9 +1,212 @@
 #!/usr/bin/env python
 import heapq
+import array
+import struct
+import zlib
+from collections import deque
 import numpy as np
 from matplotlib.colors import ListedColormap
 import matplotlib.pyplot as plt
-import copy
+
+def get_walls(maze):
+    """Check a maze and convert it into an array of walls.
+    @param maze nested N*M list (or array) describing the maze,
+           with 0 for empty cells and 1 for walls (or PackedWalls)
+    @returns N*M boolean array, True for the walls
+    """
+    if isinstance(maze, PackedWalls):
+        return maze.unpack()
+    grid = np.asarray(maze)
+    if grid.ndim != 2:
+        raise ValueError("The input maze has to be 2-dimensional")
+    if ((grid<0) | (grid>1)).any():
+        raise ValueError("Only 0's and 1's are allowed in the maze")
+    return grid == 1
+
+class PackedWalls(object):
+    """Bit-packed walls of a N*M maze, one bit per cell
+    (1 = wall), row by row as numpy.packbits: the wall of
+    cell x,y is bit 7 - (i % 8) of byte i // 8, with i = y*M + x.
+
+    The bits can be any uint8 array, in particular a numpy.memmap
+    (see load), so that grids much larger than the memory can
+    be solved with GridSearch: only the touched bytes are read.
+
+    Walls can be read by flat index (walls[i], as the bytearray
+    used by GridSearch) or by coordinates (walls[y, x], as the
+    boolean array of get_walls).
+    """
+    def __init__(self, bits, height, width):
+        """Wrap the packed bits.
+        @param bits uint8 array of at least ceil(N*M/8) bytes
+        @param height,width grid size
+        """
+        if height <= 0 or width <= 0:
+            raise ValueError("The input maze has to be 2-dimensional")
+        if len(bits) < (height * width + 7) // 8:
+            raise ValueError("Not enough bits for a %dx%d maze" % (height, width))
+        self.bits = bits
+        self.shape = (height, width)
+
+    @classmethod
+    def pack(cls, maze):
+        """Pack a maze.
+        @param maze nested N*M list (or array), see get_walls
+        @returns the packed walls
+        """
+        walls = get_walls(maze)
+        return cls(np.packbits(walls), walls.shape[0], walls.shape[1])
+
+    def save(self, filename):
+        """Write the packed bits (only) to a file, see load.
+        @param filename output file name
+        """
+        with open(filename, 'wb') as file:
+            file.write(np.asarray(self.bits[:(len(self) + 7) // 8]).tobytes())
+
+    @classmethod
+    def load(cls, filename, height, width, offset=0):
+        """Memory-map the packed bits of a file (read-only).
+        @param filename input file name
+        @param height,width grid size
+        @param offset position of the bits in the file (in bytes)
+        @returns the packed walls
+        """
+        nbytes = (height * width + 7) // 8
+        bits = np.memmap(filename, dtype=np.uint8, mode='r', offset=offset, shape=(nbytes,))
+        return cls(bits, height, width)
+
+    def copy(self):
+        """Copy the packed bits in memory (writable, see flip).
+        @returns the packed walls
+        """
+        return PackedWalls(np.array(self.bits[:(len(self) + 7) // 8]), self.shape[0], self.shape[1])
+
+    def flip(self, y, x):
+        """Turn a cell into a wall or clear it
+        (the bits must be writable, see copy).
+        @param y,x coordinates of the cell
+        """
+        key = int(y) * self.shape[1] + int(x)
+        self.bits[key >> 3] ^= 1 << (7 - (key & 7))
+
+    def __len__(self):
+        return self.shape[0] * self.shape[1]
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            y, x = key
+            key = int(y) * self.shape[1] + int(x)
+        return (self.bits.item(key >> 3) >> (7 - (key & 7))) & 1
+
+    def get_bytes(self, begin, end):
+        """Unpack a range of cells, one byte per cell (1 = wall).
+        @param begin,end flat indices of the range [begin, end)
+        @returns bytes
+        """
+        if end <= begin:
+            return b''
+        chunk = np.unpackbits(self.bits[begin >> 3:(end + 7) >> 3])
+        return chunk[begin & 7:(begin & 7) + end - begin].tobytes()
+
+    def find(self, sub, begin, end):
+        """Same as bytearray.find on the unpacked walls."""
+        pos = self.get_bytes(begin, end).find(sub)
+        return pos if pos < 0 else pos + begin
+
+    def rfind(self, sub, begin, end):
+        """Same as bytearray.rfind on the unpacked walls."""
+        pos = self.get_bytes(begin, end).rfind(sub)
+        return pos if pos < 0 else pos + begin
+
+    def unpack(self, first=0, last=None):
+        """Unpack a block of rows.
+        @param first,last rows of the block [first, last)
+               (default: the whole grid)
+        @returns (last-first)*M boolean array, True for the walls
+        """
+        height, width = self.shape
+        last = height if last is None else min(last, height)
+        cells = np.frombuffer(self.get_bytes(first * width, last * width), dtype=np.uint8)
+        return cells.reshape(-1, width) == 1
+
+#Colors of the raster images (see render_maze)
+PATH_COLOR = (0, 160, 0)
+START_COLOR = (220, 0, 0)
+END_COLOR = (0, 0, 220)
+
+#Number of cells processed at once by render_maze and write_image
+BAND_CELLS = 2**24
+
+def render_maze(walls, path=None, start=None, end=None, downsample=1):
+    """Draw a maze as an RGB image, without matplotlib.
+    With downsampling, each pixel covers downsample*downsample cells
+    and is gray according to their fraction of walls. The walls are
+    read band by band, so PackedWalls are never unpacked at once.
+    @param walls N*M boolean array (True for the walls) or PackedWalls
+    @param path list of (x,y) tuples, drawn in PATH_COLOR
+    @param start,end x,y tuples, drawn in START_COLOR and END_COLOR
+    @param downsample number of cells per pixel side
+    @returns ceil(N/downsample)*ceil(M/downsample)*3 uint8 array
+    """
+    height, width = walls.shape
+    scale = int(downsample)
+    band = max(1, BAND_CELLS // (width * scale)) * scale
+    image = np.empty(((height + scale - 1) // scale, (width + scale - 1) // scale, 3), dtype=np.uint8)
+    for y0 in range(0, height, band):
+        y1 = min(y0 + band, height)
+        if isinstance(walls, PackedWalls):
+            rows = walls.unpack(y0, y1)
+        else:
+            rows = np.asarray(walls[y0:y1], dtype=bool)
+        if scale > 1:
+            # count the walls of each block (the last ones can be partial)
+            counts = np.add.reduceat(np.add.reduceat(rows.astype(np.uint32), np.arange(0, y1-y0, scale), axis=0),
+                                     np.arange(0, width, scale), axis=1)
+            ny = np.minimum(scale, y1 - y0 - np.arange(0, y1-y0, scale))
+            nx = np.minimum(scale, width - np.arange(0, width, scale))
+            gray = 255 - (255 * counts // np.outer(ny, nx)).astype(np.uint8)
+        else:
+            gray = np.where(rows, 0, 255).astype(np.uint8)
+        image[y0 // scale:(y1 + scale - 1) // scale] = gray[:, :, None]
+    if path:
+        cells = np.asarray(path, dtype=np.int64)
+        image[cells[:, 1] // scale, cells[:, 0] // scale] = PATH_COLOR
+    for point, color in ((start, START_COLOR), (end, END_COLOR)):
+        if point is not None:
+            image[point[1] // scale, point[0] // scale] = color
+    return image
+
+def write_image(image, output):
+    """Write an RGB image in PNG (default) or PPM (.ppm extension) format.
+    @param image N*M*3 uint8 array
+    @param output output file name
+    """
+    height, width = image.shape[:2]
+    band = max(1, BAND_CELLS // (3 * width))
+    with open(output, 'wb') as file:
+        if output.lower().endswith('.ppm'):
+            file.write(b'P6\n%d %d\n255\n' % (width, height))
+            for y0 in range(0, height, band):
+                file.write(np.ascontiguousarray(image[y0:y0+band]).tobytes())
+            return
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + \
+                   struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+        file.write(b'\x89PNG\r\n\x1a\n')
+        # 8-bit RGB, no interlacing
+        file.write(chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)))
+        # the compressed stream is split in one IDAT chunk per band
+        compressor = zlib.compressobj(6)
+        for y0 in range(0, height, band):
+            rows = image[y0:y0+band].reshape(-1, width * 3)
+            # filter type 0 (none) at the start of each row
+            rows = np.hstack((np.zeros((len(rows), 1), dtype=np.uint8), rows))
+            data = compressor.compress(rows.tobytes())
+            if data:
+                file.write(chunk(b'IDAT', data))
+        file.write(chunk(b'IDAT', compressor.flush()))
+        file.write(chunk(b'IEND', b''))
 
 class MazeCell(object):
     def __init__(self, x, y, iswall):
@@ -54,6 +257,8 @@ class Maze(object):
                empty cells identified as 0
                walls identified as 1
                e.g. 4*3 maze: [[0,1,0], [0,0,0], [1,1,0], [0,1,0]]
+               or PackedWalls (used as they are, for large grids
+               solved with the 'array' or 'jps' backends)
                By default, start = upper left and stop = bottom right
                unless specified differently with start and stop arguments.
         @param start grid starting point x,y tuple.
@@ -61,45 +266,54 @@ class Maze(object):
         """
         self.maze = maze
         self.path = None
+        self.expanded = 0
+        # incremental planner (built by the first call to replan)
+        self.planner = None
         # check maze (shape and consistency)
-        if len(np.shape(maze)) != 2:
-            raise ValueError("The input maze has to be 2-dimensional")
-        self.grid_height = np.shape(maze)[0]
-        self.grid_width = np.shape(maze)[1]
+        if isinstance(maze, PackedWalls):
+            self.walls = maze
+        else:
+            self.walls = get_walls(maze)
+        self.grid_height, self.grid_width = self.walls.shape
         # open list
         self.opened = []
         heapq.heapify(self.opened)
-        # grid cells
+        # grid cells (built by the first call to solve with the 'cells' backend)
         self.cells = []
-        for x in range(self.grid_width):
-            for y in range(self.grid_height):
-                if maze[y][x]<0 or maze[y][x]>1:
-                    raise ValueError("Only 0's and 1's are allowed in the maze")
-                iswall = True if maze[y][x]==1 else False
-                self.cells.append(MazeCell(x, y, iswall))
         # visited cells list
         self.closed = set()
         # endpoints
         if start is not None:
-            if maze[start[1]][start[0]] == 1:
+            if self.walls[start[1], start[0]]:
                 raise ValueError("You can't assign the start to a cell with a wall")
             else:
-                self.start = self.get_cell(*start)
+                self.start = MazeCell(start[0], start[1], False)
         else:
-            if maze[0][0] == 1:
+            if self.walls[0, 0]:
                 raise ValueError("A wall and the start (top left) are overlapping")
             else:
-                self.start = self.get_cell(0,0)
+                self.start = MazeCell(0, 0, False)
         if end is not None:
-            if maze[end[1]][end[0]] == 1:
+            if self.walls[end[1], end[0]]:
                 raise ValueError("You can't assign the stop to a cell with a wall")
             else:
-                self.end = self.get_cell(*end)
+                self.end = MazeCell(end[0], end[1], False)
         else:
-            if maze[self.grid_height-1][self.grid_width-1] == 1:
+            if self.walls[self.grid_height-1, self.grid_width-1]:
                 raise ValueError("A wall and the stop (bottom right) are overlapping")
             else:
-                self.end = self.get_cell(self.grid_width-1, self.grid_height-1)
+                self.end = MazeCell(self.grid_width-1, self.grid_height-1, False)
+
+    def build_cells(self):
+        """Create one MazeCell per grid cell
+        (only needed by the 'cells' backend of solve).
+        """
+        self.cells = []
+        for x in range(self.grid_width):
+            for y in range(self.grid_height):
+                self.cells.append(MazeCell(x, y, bool(self.walls[y, x])))
+        self.start = self.get_cell(self.start.x, self.start.y)
+        self.end = self.get_cell(self.end.x, self.end.y)
 
     def get_cost(self, cell):
         """Compute the (heuristic) cost h to move from this cell
@@ -162,12 +376,12 @@ class Maze(object):
         -green: path (if defined)
         """
         cmap = ListedColormap(['w', 'k'])
-        mazeplot = copy.deepcopy(self.maze)
+        mazeplot = get_walls(self.walls).astype(np.uint8)
         if self.path:
             cmap = ListedColormap(['w', 'k', 'g'])
             #Add path
-            for p in self.path:
-                mazeplot[p[1]][p[0]] = 2
+            xs, ys = zip(*self.path)
+            mazeplot[ys, xs] = 2
         #Make plot
         fig = plt.figure()
         ax = fig.add_subplot(111)
@@ -177,10 +391,43 @@ class Maze(object):
         ax.text(self.end.x, self.end.y, "END", color='black', ha='center', va='center')
         fig.savefig(output)
 
-    def solve(self):
+    def render(self, output='maze.png', downsample=1):
+        """Write maze as a raster image (PNG, or PPM with the .ppm
+        extension), see render_maze: faster and lighter than
+        plot_maze, which is better suited to small mazes.
+        @param output output file name
+        @param downsample number of cells per pixel side
+        Legend:
+        -white: empty cells (gray: partly walls, when downsampling)
+        -black: walls
+        -green: path (if defined)
+        -red/blue: start/end
+        """
+        image = render_maze(self.walls, self.path, (self.start.x, self.start.y),
+                            (self.end.x, self.end.y), downsample)
+        write_image(image, output)
+
+    def solve(self, backend='cells'):
         """Solve maze, find path to ending cell.
+        @param backend A* implementation:
+               'cells' -> one MazeCell object per grid cell (default)
+               'array' -> flat per-cell arrays, see GridSearch
+               'jps'   -> Jump Point Search on the flat arrays,
+                          see GridSearch.jps
         @returns path (or None if not found) and its lenght
         """
+        if backend in ('array', 'jps'):
+            search = GridSearch(self.walls)
+            solver = search.astar if backend == 'array' else search.jps
+            self.path, pathlen = solver((self.start.x, self.start.y), (self.end.x, self.end.y))
+            self.expanded = search.expanded
+            if self.path is None:
+                print "Warning: impossible maze!"
+            return self.path, pathlen
+        elif backend != 'cells':
+            raise ValueError("Unknown backend '%s'" % backend)
+        if not self.cells:
+            self.build_cells()
         # add starting cell to open heap queue
         heapq.heappush(self.opened, (self.start.f, self.start))
         while len(self.opened):
@@ -188,6 +435,7 @@ class Maze(object):
             f, cell = heapq.heappop(self.opened)
             # add cell to closed list so we don't process it twice
             self.closed.add(cell)
+            self.expanded += 1
             # if ending cell, return found path
             if cell is self.end:
                 self.path = self.get_path()
@@ -210,3 +458,624 @@ class Maze(object):
             if len(self.opened)==0:
                 print "Warning: impossible maze!"
                 return None, 0
+
+    def replan(self, changed=None):
+        """Solve maze incrementally, see IncrementalSearch.
+        The first call runs a full search, the following ones only
+        repair the previous solution after some walls changed.
+        @param changed list of x,y tuples of the cells whose wall
+               state changed since the last call (turned into walls
+               or cleared)
+        @returns path (or None if not found) and its lenght, the
+                 number of (re-)expanded cells is in expanded
+        """
+        if self.planner is None:
+            if changed:
+                raise ValueError("No previous solution to repair")
+            self.planner = IncrementalSearch(self.walls, (self.start.x, self.start.y),
+                                             (self.end.x, self.end.y))
+            self.path, pathlen = self.planner.solve()
+        else:
+            changed = changed or []
+            # the planner checks the cells and flips its own copy first
+            self.path, pathlen = self.planner.update(changed)
+            if changed and self.walls is self.maze:
+                # the packed walls are the caller's (maybe read-only): flip a copy
+                self.walls = self.walls.copy()
+            for x, y in changed:
+                if isinstance(self.walls, PackedWalls):
+                    self.walls.flip(y, x)
+                else:
+                    self.walls[y, x] = not self.walls[y, x]
+        self.expanded = self.planner.expanded
+        if self.path is None:
+            print "Warning: impossible maze!"
+        return self.path, pathlen
+
+class SparseState(dict):
+    """Per-cell search state holding only the touched cells,
+    with a default value for all the others (see GridSearch)
+    """
+    def __init__(self, default):
+        dict.__init__(self)
+        self.default = default
+
+    def __missing__(self, cell):
+        return self.default
+
+class GridSearch(object):
+    """
+    Implements "A*" on a N*M grid, keeping the search state
+    in flat arrays indexed by y*width + x instead of cell objects
+    """
+    INF = 2**31 - 1
+    #Above this number of cells the state is sparse by default
+    SPARSE_CELLS = 2**25
+
+    def __init__(self, walls, sparse=None):
+        """Prepare the flat arrays.
+        @param walls N*M array (or nested list) of booleans,
+               True for the walls, or PackedWalls (read in place)
+        @param sparse keep the search state in dictionaries holding
+               only the touched cells, instead of arrays of N*M
+               entries (default: only for grids of more than
+               SPARSE_CELLS cells)
+        """
+        if isinstance(walls, PackedWalls):
+            self.walls = walls
+            self.grid_height, self.grid_width = walls.shape
+        else:
+            walls = np.asarray(walls, dtype=bool)
+            self.grid_height, self.grid_width = walls.shape
+            # one byte per cell (1 = wall)
+            self.walls = bytearray(walls.astype(np.uint8).tobytes())
+        ncells = self.grid_height * self.grid_width
+        if sparse is None:
+            sparse = ncells > GridSearch.SPARSE_CELLS
+        self.sparse = sparse
+        if sparse:
+            self.g = SparseState(GridSearch.INF)
+            self.parent = SparseState(-1)
+            self.closed = SparseState(0)
+        else:
+            # cost from the start (unreached cells are at INF)
+            self.g = array.array('i', [GridSearch.INF]) * ncells
+            # index of the parent cell (-1 = no parent)
+            self.parent = array.array('i', [-1]) * ncells
+            # visited cells
+            self.closed = bytearray(ncells)
+        # cells whose state has been changed by the search
+        self.touched = []
+        self.expanded = 0
+
+    def reset(self):
+        """Clear the search state, so that a new search can run.
+        Only the touched cells are visited.
+        """
+        if self.sparse:
+            self.g.clear()
+            self.parent.clear()
+            self.closed.clear()
+            self.touched = []
+            self.expanded = 0
+            return
+        g = self.g
+        parent = self.parent
+        closed = self.closed
+        for cell in self.touched:
+            g[cell] = GridSearch.INF
+            parent[cell] = -1
+            closed[cell] = 0
+        self.touched = []
+        self.expanded = 0
+
+    def get_index(self, x, y):
+        return int(y) * self.grid_width + int(x)
+
+    def get_path(self, end):
+        """Follow the parent indices back from a cell.
+        @param end index of the last cell
+        @returns path as list of (x,y) tuples, from the start
+        """
+        path = []
+        cell = end
+        while cell != -1:
+            y, x = divmod(cell, self.grid_width)
+            path.append((x, y))
+            cell = self.parent[cell]
+        path.reverse()
+        return path
+
+    def astar(self, start, end):
+        """Find the shortest path between two cells.
+        The open list is a heap with lazy deletion: a cell is pushed
+        again whenever its cost improves, and the outdated entries
+        are skipped when popped, so membership tests are O(1) array
+        lookups. Ties on f are broken in favour of the lowest h.
+        @param start starting cell x,y tuple
+        @param end ending cell x,y tuple
+        @returns path (or None if not found) and its lenght
+        """
+        width = self.grid_width
+        height = self.grid_height
+        walls = self.walls
+        g = self.g
+        parent = self.parent
+        closed = self.closed
+        ex, ey = end
+        first = self.get_index(*start)
+        last = self.get_index(*end)
+        g[first] = 0
+        touched = self.touched
+        touched.append(first)
+        h = abs(start[0] - ex) + abs(start[1] - ey)
+        opened = [(h, h, first)]
+        while opened:
+            f, h, cell = heapq.heappop(opened)
+            if closed[cell]:
+                continue
+            closed[cell] = 1
+            self.expanded += 1
+            if cell == last:
+                path = self.get_path(last)
+                return path, len(path)
+            y, x = divmod(cell, width)
+            cost = g[cell] + 1
+            # adjacent cells, clockwise starting from the one on the right
+            for adj, ax, ay in ((cell+1, x+1, y), (cell-width, x, y-1),
+                                (cell-1, x-1, y), (cell+width, x, y+1)):
+                if 0 <= ax < width and 0 <= ay < height and \
+                   not walls[adj] and not closed[adj] and cost < g[adj]:
+                    g[adj] = cost
+                    touched.append(adj)
+                    parent[adj] = cell
+                    h = abs(ax - ex) + abs(ay - ey)
+                    heapq.heappush(opened, (cost + h, h, adj))
+        return None, 0
+
+    def is_free(self, x, y):
+        return 0 <= x < self.grid_width and 0 <= y < self.grid_height and \
+               not self.walls[y * self.grid_width + x]
+
+    def jump_horizontal(self, x, y, dx, end):
+        """Jump from a cell along its row (see jps).
+        It stops at the ending cell, or at the first cell with a forced
+        vertical neighbour: a free cell above/below whose own neighbour
+        behind (at x-dx) is a wall. The scans run on the wall bytes.
+        @param x,y starting cell
+        @param dx direction (+1 right, -1 left)
+        @param end ending cell x,y tuple
+        @returns jump point x,y tuple (None if a wall is hit first)
+        """
+        width = self.grid_width
+        walls = self.walls
+        row = y * width
+        if dx > 0:
+            # first wall on the right
+            limit = walls.find(b'\x01', row + x + 1, row + width)
+            limit = width if limit < 0 else limit - row
+            stop = limit
+            for ny in (y-1, y+1):
+                if 0 <= ny < self.grid_height:
+                    # wall followed by a free cell
+                    forced = walls.find(b'\x01\x00', ny*width + x, ny*width + limit)
+                    if forced >= 0:
+                        stop = min(stop, forced + 1 - ny*width)
+            if end[1] == y and x < end[0] < stop:
+                stop = end[0]
+            return (stop, y) if stop < limit else None
+        else:
+            # first wall on the left
+            limit = walls.rfind(b'\x01', row, row + x)
+            limit = -1 if limit < 0 else limit - row
+            stop = limit
+            for ny in (y-1, y+1):
+                if 0 <= ny < self.grid_height:
+                    # free cell followed by a wall
+                    forced = walls.rfind(b'\x00\x01', ny*width + limit + 1, ny*width + x + 1)
+                    if forced >= 0:
+                        stop = max(stop, forced - ny*width)
+            if end[1] == y and stop < end[0] < x:
+                stop = end[0]
+            return (stop, y) if stop > limit else None
+
+    def jump_vertical(self, x, y, dy, end):
+        """Jump from a cell along its column (see jps).
+        It stops at the ending cell, or at the first cell
+        from which a horizontal jump finds a jump point.
+        @param x,y starting cell
+        @param dy direction (+1 down, -1 up)
+        @param end ending cell x,y tuple
+        @returns jump point x,y tuple (None if a wall is hit first)
+        """
+        while True:
+            y += dy
+            if not self.is_free(x, y):
+                return None
+            if (x, y) == end:
+                return x, y
+            if self.jump_horizontal(x, y, 1, end) or self.jump_horizontal(x, y, -1, end):
+                return x, y
+
+    def jps(self, start, end):
+        """Find the shortest path between two cells with
+        Jump Point Search for 4-connected grids (uniform costs).
+        Among equivalent shortest paths only the "canonical" ones are
+        followed: vertical moves can turn left or right at any cell,
+        horizontal moves only turn when forced by a wall. Straight
+        moves are replaced by jumps to the next cell where this can
+        happen, and only these jump points enter the open list.
+        It uses the same Manhattan heuristic and tie breaking as astar.
+        @param start starting cell x,y tuple
+        @param end ending cell x,y tuple
+        @returns path expanded cell by cell (or None if not found)
+                 and its lenght
+        """
+        width = self.grid_width
+        g = self.g
+        parent = self.parent
+        closed = self.closed
+        ex, ey = end
+        first = self.get_index(*start)
+        last = self.get_index(*end)
+        g[first] = 0
+        touched = self.touched
+        touched.append(first)
+        h = abs(start[0] - ex) + abs(start[1] - ey)
+        opened = [(h, h, first)]
+        while opened:
+            f, h, cell = heapq.heappop(opened)
+            if closed[cell]:
+                continue
+            closed[cell] = 1
+            self.expanded += 1
+            if cell == last:
+                path = self.get_jump_path(last)
+                return path, len(path)
+            y, x = divmod(cell, width)
+            # directions allowed by the canonical ordering
+            if parent[cell] == -1:
+                directions = [(1, 0), (0, -1), (-1, 0), (0, 1)]
+            else:
+                py, px = divmod(parent[cell], width)
+                if py == y:
+                    dx = 1 if x > px else -1
+                    directions = [(dx, 0)]
+                    for dy in (-1, 1):
+                        if self.is_free(x, y+dy) and not self.is_free(x-dx, y+dy):
+                            directions.append((0, dy))
+                else:
+                    dy = 1 if y > py else -1
+                    directions = [(0, dy), (1, 0), (-1, 0)]
+            for dx, dy in directions:
+                if dy == 0:
+                    point = self.jump_horizontal(x, y, dx, end)
+                else:
+                    point = self.jump_vertical(x, y, dy, end)
+                if point is None:
+                    continue
+                adj = self.get_index(*point)
+                cost = g[cell] + abs(point[0] - x) + abs(point[1] - y)
+                if not closed[adj] and cost < g[adj]:
+                    g[adj] = cost
+                    touched.append(adj)
+                    parent[adj] = cell
+                    h = abs(point[0] - ex) + abs(point[1] - ey)
+                    heapq.heappush(opened, (cost + h, h, adj))
+        return None, 0
+
+    def get_jump_path(self, end):
+        """Expand the path of jump points found by jps cell by cell.
+        @param end index of the last cell
+        @returns path as list of (x,y) tuples, from the start
+        """
+        points = self.get_path(end)
+        path = points[:1]
+        for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+            dx = (x1 > x0) - (x1 < x0)
+            dy = (y1 > y0) - (y1 < y0)
+            while (x0, y0) != (x1, y1):
+                x0 += dx
+                y0 += dy
+                path.append((x0, y0))
+        return path
+
+class IncrementalSearch(object):
+    """
+    Implements "Lifelong Planning A*" (LPA*) between two fixed cells
+    of a N*M grid whose walls change over time: after a change only
+    the cells whose cost from the start is affected are expanded again
+    """
+    INF = GridSearch.INF
+
+    def __init__(self, walls, start, end):
+        """Prepare the flat arrays (see GridSearch).
+        @param walls N*M array (or nested list) of booleans,
+               True for the walls (copied: later changes go
+               through update)
+        @param start starting cell x,y tuple
+        @param end ending cell x,y tuple
+        """
+        walls = get_walls(walls) if isinstance(walls, PackedWalls) else np.asarray(walls, dtype=bool)
+        self.grid_height, self.grid_width = walls.shape
+        ncells = self.grid_height * self.grid_width
+        self.walls = bytearray(walls.astype(np.uint8).tobytes())
+        # cost from the start found by the last expansion of a cell
+        self.g = array.array('i', [IncrementalSearch.INF]) * ncells
+        # one-step lookahead cost: 1 + min g of the free neighbours
+        self.rhs = array.array('i', [IncrementalSearch.INF]) * ncells
+        self.ex, self.ey = end
+        self.first = int(start[1]) * self.grid_width + int(start[0])
+        self.last = int(end[1]) * self.grid_width + int(end[0])
+        # heap of the locally inconsistent cells (g != rhs), with
+        # lazy deletion: outdated entries are skipped when popped
+        self.opened = []
+        self.expanded = 0
+        self.rhs[self.first] = 0 if not self.walls[self.first] else IncrementalSearch.INF
+        self.push(self.first)
+
+    def get_key(self, cell):
+        best = min(self.g[cell], self.rhs[cell])
+        y, x = divmod(cell, self.grid_width)
+        return best + abs(x - self.ex) + abs(y - self.ey), best
+
+    def push(self, cell):
+        if self.g[cell] != self.rhs[cell]:
+            heapq.heappush(self.opened, self.get_key(cell) + (cell,))
+
+    def get_adjacent(self, cell):
+        """Free adjacent cells, clockwise starting from the one on the right."""
+        width = self.grid_width
+        y, x = divmod(cell, width)
+        walls = self.walls
+        cells = []
+        for adj, ax, ay in ((cell+1, x+1, y), (cell-width, x, y-1),
+                            (cell-1, x-1, y), (cell+width, x, y+1)):
+            if 0 <= ax < width and 0 <= ay < self.grid_height and not walls[adj]:
+                cells.append(adj)
+        return cells
+
+    def update_cell(self, cell):
+        """Recompute rhs of a cell and queue it if inconsistent."""
+        if cell != self.first:
+            if self.walls[cell]:
+                self.rhs[cell] = IncrementalSearch.INF
+            else:
+                g = self.g
+                best = min([ g[adj] for adj in self.get_adjacent(cell) ] or [IncrementalSearch.INF])
+                self.rhs[cell] = best + 1 if best < IncrementalSearch.INF else best
+        self.push(cell)
+
+    def get_top(self):
+        """Drop the outdated entries at the top of the heap.
+        @returns key of the first valid entry (INF if empty)
+        """
+        opened = self.opened
+        while opened:
+            k1, k2, cell = opened[0]
+            if self.g[cell] != self.rhs[cell] and (k1, k2) == self.get_key(cell):
+                return k1, k2
+            heapq.heappop(opened)
+        return IncrementalSearch.INF, IncrementalSearch.INF
+
+    def compute_path(self):
+        """Expand the inconsistent cells until the ending cell
+        is consistent and no cheaper cell is left in the heap.
+        @returns number of expanded cells
+        """
+        g = self.g
+        rhs = self.rhs
+        last = self.last
+        expanded = 0
+        while self.get_top() < self.get_key(last) or rhs[last] != g[last]:
+            cell = heapq.heappop(self.opened)[2]
+            expanded += 1
+            if g[cell] > rhs[cell]:
+                # overconsistent: the cost went down
+                g[cell] = rhs[cell]
+                for adj in self.get_adjacent(cell):
+                    self.update_cell(adj)
+            else:
+                # underconsistent: the cost went up, so the cell and
+                # the cells that may depend on it are recomputed
+                g[cell] = IncrementalSearch.INF
+                self.update_cell(cell)
+                for adj in self.get_adjacent(cell):
+                    self.update_cell(adj)
+        return expanded
+
+    def get_path(self):
+        """Follow the decreasing costs back from the ending cell.
+        @returns path as list of (x,y) tuples, from the start
+                 (None if not found)
+        """
+        g = self.g
+        cell = self.last
+        if g[cell] == IncrementalSearch.INF or self.walls[self.first]:
+            return None
+        path = []
+        width = self.grid_width
+        while True:
+            y, x = divmod(cell, width)
+            path.append((x, y))
+            if cell == self.first:
+                break
+            cell = min(self.get_adjacent(cell), key=lambda adj: g[adj])
+        path.reverse()
+        return path
+
+    def solve(self):
+        """Find (or repair) the shortest path.
+        @returns path (or None if not found) and its lenght
+        """
+        self.expanded = self.compute_path()
+        path = self.get_path()
+        return path, (0 if path is None else len(path))
+
+    def update(self, cells):
+        """Flip the walls of some cells and repair the path.
+        @param cells list of x,y tuples of the cells that turned
+               into walls or were cleared
+        @returns path (or None if not found) and its lenght,
+                 the number of re-expanded cells is in expanded
+        """
+        width = self.grid_width
+        # check all the cells before changing anything
+        for x, y in cells:
+            if not (0 <= x < width and 0 <= y < self.grid_height):
+                raise ValueError("Cell (%d,%d) is outside the maze" % (x, y))
+        for x, y in cells:
+            cell = int(y) * width + int(x)
+            self.walls[cell] ^= 1
+            if cell == self.first:
+                self.rhs[cell] = 0 if not self.walls[cell] else IncrementalSearch.INF
+            self.update_cell(cell)
+            y, x = divmod(cell, width)
+            for adj, ax, ay in ((cell+1, x+1, y), (cell-width, x, y-1),
+                                (cell-1, x-1, y), (cell+width, x, y+1)):
+                if 0 <= ax < width and 0 <= ay < self.grid_height:
+                    self.update_cell(adj)
+        return self.solve()
+
+class MazeSolver(object):
+    """
+    Reusable solver for many start/end queries on the same maze
+    """
+    def __init__(self, maze):
+        """Preprocess the maze: label its connected components.
+        @param maze nested N*M list (or array) describing the maze,
+               see Maze
+        """
+        self.walls = get_walls(maze)
+        self.grid_height, self.grid_width = self.walls.shape
+        self.search = GridSearch(self.walls)
+        self.components = self.label_components()
+        # BFS fields of the cached targets (see cache_target)
+        self.fields = {}
+        self.expanded = 0
+
+    def label_components(self):
+        """Label the connected components of the empty cells.
+        The grid is split in horizontal runs of empty cells
+        (with vectorized operations), then the runs of consecutive
+        rows that overlap are merged with a union-find.
+        @returns N*M int32 array with the component of each cell
+                 (-1 for the walls)
+        """
+        height, width = self.walls.shape
+        # pad each row with a wall, so that runs never span two rows
+        free = np.ones((height, width+1), dtype=np.int8)
+        free[:, :width] = ~self.walls
+        free = np.concatenate(([0], free.ravel(), [0]))
+        free[1 + width::width+1] = 0
+        edges = np.diff(free)
+        starts = np.flatnonzero(edges == 1)
+        ends = np.flatnonzero(edges == -1)
+        rows = starts // (width+1)
+        row_first = np.searchsorted(rows, np.arange(height+1)).tolist()
+        starts_x = (starts - rows*(width+1)).tolist()
+        ends_x = (ends - rows*(width+1)).tolist()
+        # union-find on the runs
+        parent = list(range(len(starts_x)))
+        def find(i):
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for y in range(1, height):
+            # merge the overlapping runs of rows y-1 and y
+            i, iend = row_first[y-1], row_first[y]
+            j, jend = row_first[y], row_first[y+1]
+            while i < iend and j < jend:
+                if starts_x[i] < ends_x[j] and starts_x[j] < ends_x[i]:
+                    ri, rj = find(i), find(j)
+                    if ri != rj:
+                        parent[ri] = rj
+                if ends_x[i] < ends_x[j]:
+                    i += 1
+                else:
+                    j += 1
+        roots = np.array([ find(i) for i in range(len(parent)) ], dtype=np.int32)
+        # number the components as 0, 1, ...
+        roots = np.unique(roots, return_inverse=True)[1].astype(np.int32)
+        labels = np.full(height*(width+1), -1, dtype=np.int32)
+        lengths = ends - starts
+        cells = np.repeat(starts - np.cumsum(np.concatenate(([0], lengths[:-1]))), lengths) + \
+                np.arange(lengths.sum())
+        labels[cells] = np.repeat(roots, lengths)
+        return labels.reshape(height, width+1)[:, :width]
+
+    def check_cell(self, cell, name):
+        x, y = cell
+        if not (0 <= x < self.grid_width and 0 <= y < self.grid_height):
+            raise ValueError("The %s is outside the maze" % name)
+        if self.walls[y, x]:
+            raise ValueError("You can't assign the %s to a cell with a wall" % name)
+
+    def is_connected(self, start, end):
+        """Check (in O(1)) if two cells can be connected.
+        @param start,end cells x,y tuples
+        @returns True if the cells are in the same component
+        """
+        return self.components[start[1], start[0]] == self.components[end[1], end[0]]
+
+    def cache_target(self, end):
+        """Run a BFS from a (frequently used) ending cell and keep,
+        for every cell of its component, the next cell on a shortest
+        path towards it: queries with this ending cell then
+        become a walk along these pointers.
+        @param end ending cell x,y tuple
+        """
+        self.check_cell(end, 'stop')
+        width = self.grid_width
+        height = self.grid_height
+        walls = self.search.walls
+        last = self.search.get_index(*end)
+        towards = array.array('i', [-1]) * (width * height)
+        towards[last] = last
+        queue = deque([last])
+        while queue:
+            cell = queue.popleft()
+            y, x = divmod(cell, width)
+            for adj, ax, ay in ((cell+1, x+1, y), (cell-width, x, y-1),
+                                (cell-1, x-1, y), (cell+width, x, y+1)):
+                if 0 <= ax < width and 0 <= ay < height and \
+                   not walls[adj] and towards[adj] == -1:
+                    towards[adj] = cell
+                    queue.append(adj)
+        self.fields[tuple(end)] = towards
+
+    def solve(self, start, end, backend='array'):
+        """Find the shortest path between two cells.
+        Impossible queries are rejected with the component labels,
+        cached targets are answered from their BFS field, the others
+        run a new search (resetting only the cells touched by the
+        previous one).
+        @param start starting cell x,y tuple
+        @param end ending cell x,y tuple
+        @param backend 'array' (A*) or 'jps', see Maze.solve
+        @returns path (or None if not found) and its lenght
+        """
+        self.check_cell(start, 'start')
+        self.check_cell(end, 'stop')
+        self.expanded = 0
+        if not self.is_connected(start, end):
+            return None, 0
+        width = self.grid_width
+        towards = self.fields.get(tuple(end))
+        if towards is not None:
+            cell = self.search.get_index(*start)
+            path = []
+            while True:
+                y, x = divmod(cell, width)
+                path.append((x, y))
+                if towards[cell] == cell:
+                    return path, len(path)
+                cell = towards[cell]
+        if backend not in ('array', 'jps'):
+            raise ValueError("Unknown backend '%s'" % backend)
+        self.search.reset()
+        solver = self.search.astar if backend == 'array' else self.search.jps
+        path, pathlen = solver(start, end)
+        self.expanded = self.search.expanded
+        return path, pathlen
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+
+import os, sys
+import numpy as np
+sys.path.append("../python")
+
+from maze_batch import write_mazes, solve_batch
+
+def random_mazes(nmazes, size, density, seed=42):
+    """Generate random square mazes (start and end are kept empty).
+    @param nmazes number of mazes
+    @param size number of cells per side
+    @param density fraction of walls
+    @param seed seed for the random generation
+    @returns generator over the (maze, start, end) tuples
+    """
+    rng = np.random.RandomState(seed)
+    for i in range(nmazes):
+        maze = (rng.uniform(size=(size, size)) < density).astype(np.uint8)
+        maze[0, 0] = 0
+        maze[-1, -1] = 0
+        yield maze, None, None
+
+if __name__ == "__main__":
+    write_mazes('mazes.bin', random_mazes(100, 200, 0.3))
+    print "Maze, path length, expanded cells, time (s):"
+    for index, pathlen, expanded, solve_time in solve_batch('mazes.bin'):
+        print "%d %d %d %.3f" % (index, pathlen, expanded, solve_time)
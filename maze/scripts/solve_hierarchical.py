@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+import os, sys
+import time
+import numpy as np
+sys.path.append("../python")
+
+from maze_utils import GridSearch, PackedWalls, render_maze, write_image
+from maze_hpa import HierarchicalSearch
+
+if __name__ == "__main__":
+    size = 1000
+    rng = np.random.RandomState(42)
+    walls = rng.uniform(size=(size, size)) < 0.2
+    walls[0, 0] = walls[-1, -1] = False
+    packed = PackedWalls.pack(walls)
+    # The abstraction is built once and cached on disk
+    if os.path.exists('abstraction.npz'):
+        search = HierarchicalSearch.load('abstraction.npz', packed)
+    else:
+        start = time.time()
+        search = HierarchicalSearch(packed, cluster=32)
+        print "Abstraction built in %.2f s" % (time.time() - start)
+        search.save('abstraction.npz')
+    queries = [((0, 0), (size-1, size-1)), ((0, size-1), (size-1, 0)), ((10, 500), (990, 480))]
+    for start, end in queries:
+        if walls[start[1], start[0]] or walls[end[1], end[0]]:
+            continue
+        begin = time.time()
+        path, pathlen = search.solve(start, end)
+        hpa_time = time.time() - begin
+        begin = time.time()
+        grid = GridSearch(walls)
+        _, best = grid.astar(start, end)
+        astar_time = time.time() - begin
+        print "From %s to %s:" % (start, end)
+        print "HPA*: %d cells, %d abstract nodes expanded (%.3f s)" % (pathlen, search.expanded, hpa_time)
+        print "A*:   %d cells, %d cells expanded (%.3f s)" % (best, grid.expanded, astar_time)
+    # Close a corridor (update flips the cells, so only the free ones
+    # are given): only the clusters around it are rebuilt
+    begin = time.time()
+    search.update([(500, y) for y in range(480, 520) if not walls[y, 500]])
+    print "Abstraction updated in %.3f s" % (time.time() - begin)
+    path, pathlen = search.solve(*queries[0])
+    print "From %s to %s: %d cells" % (queries[0] + (pathlen,))
+    # Raster image of the new path over the updated walls, 2*2 cells per pixel
+    # (packed is left as it was: the changes are only recorded by search)
+    updated = search.get_rows(0, size)
+    write_image(render_maze(updated, path, queries[0][0], queries[0][1], downsample=2), 'hierarchical.png')
@@ -3,7 +3,7 @@
 import os, sys
 sys.path.append("../python")
 
-from maze_utils import Maze
+from maze_utils import Maze, MazeSolver
 
 normal = [[0, 0, 0, 0, 0, 1],
           [1, 1, 0, 0, 0, 1],
@@ -36,3 +36,18 @@ def solve_maze(maze, start=None, end=None, output='maze.pdf'):
 if __name__ == "__main__":
     solve_maze(normal, output='normal.png')
     solve_maze(impossible, output='impossible.png')
+    # The same maze can be queried many times (impossible queries are rejected at once)
+    solver = MazeSolver(impossible)
+    for start, end in [((0,0), (5,6)), ((0,0), (4,5)), ((2,4), (0,6))]:
+        path, pathlen = solver.solve(start, end)
+        print "Path from %s to %s:" % (start, end)
+        print path
+    # Close and reopen a door: only the affected cells are searched again
+    the_maze = Maze(normal)
+    path, pathlen = the_maze.replan()
+    print "Initial path (%d cells expanded):" % the_maze.expanded
+    print path
+    for changed in [[(3, 4)], [(3, 4)]]:
+        path, pathlen = the_maze.replan(changed)
+        print "Path after flipping %s (%d cells expanded):" % (changed, the_maze.expanded)
+        print path
@@ -0,0 +1,3 @@
+#!/usr/bin/env python
+"""Utilities shared by the puzzles (install with pip install -e .
+from the repository root)."""
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+import numbers
+import numpy as np
+from math import sqrt, exp, log, lgamma, erfc
+
+def count_successes(passed):
+    """Count the successes of a block of trials.
+
+    @param passed boolean array indicating if the given trial is
+           successful (True) or not (False), (successes, trials)
+           pair (a tuple of two integers, not booleans) or
+           BinomialCounts
+    @return values success, trials
+    """
+    if isinstance(passed, BinomialCounts):
+        return passed.success, passed.trials
+    if isinstance(passed, tuple) and len(passed) == 2 and \
+       all( isinstance(n, numbers.Integral) and not isinstance(n, bool) for n in passed ):
+        success, trials = int(passed[0]), int(passed[1])
+        if not 0 <= success <= trials:
+            raise ValueError("Invalid (successes, trials) pair (%d, %d)" % (success, trials))
+        return success, trials
+    passed = np.asarray(passed)
+    return int(np.count_nonzero(passed)), int(passed.size)
+
+class BinomialCounts(object):
+    """Running counts of successes and trials.
+
+    To count a stream of blocks (boolean arrays or (successes, trials)
+    pairs, see count_successes):
+    counts = BinomialCounts.from_blocks(blocks)
+
+    Partial counts (e.g. returned by parallel workers) are merged
+    with merge (or +), and (success, trials) is all there is to save.
+    """
+    def __init__(self, success=0, trials=0):
+        self.success = success
+        self.trials = trials
+    @classmethod
+    def from_blocks(cls, blocks):
+        counts = cls()
+        for block in blocks:
+            counts.update(block)
+        return counts
+    def update(self, block):
+        """Add a block of trials (see count_successes).
+        @return the counts themselves
+        """
+        success, trials = count_successes(block)
+        self.success += success
+        self.trials += trials
+        return self
+    def merge(self, other):
+        return self.update(other)
+    def __iadd__(self, other):
+        return self.update(other)
+    def __add__(self, other):
+        return BinomialCounts(self.success, self.trials).update(other)
+    def prob(self):
+        return self.success / float(self.trials)
+    def get_error(self):
+        """Binomial standard error of the probability."""
+        return get_binomial_error(self.success, self.trials)
+    def get_interval(self, method='wilson', z=1.96):
+        """Confidence interval of the probability, see get_interval."""
+        return get_interval(self.success, self.trials, method, z)
+
+def get_binomial_error(success, trials):
+    """Compute the standard error of a binomial probability
+    @param success number of successes
+    @param trials number of trials
+    @return standard error
+    """
+    prob = success / float(trials)
+    return sqrt(prob*(1.-prob) / float(trials))
+
+def get_binomial_prob(passed, trials=None, verbose=True):
+    """Compute the binomial probability of success
+
+    @param passed boolean array indicating if the given trial is
+           successful (True) or not (False), or number of successes
+           (see also count_successes)
+    @param trials number of trials (default: size of passed,
+           required with a number of successes)
+    @param verbose print probability and uncertainty
+    @return values prob, prob_err (probability and its uncertainty)
+    """
+    if np.ndim(passed) == 0:
+        if trials is None:
+            raise ValueError("The number of trials is required with a number of successes")
+        success = int(passed)
+    else:
+        success, size = count_successes(passed)
+        trials = size if trials is None else trials
+    prob = success / float(trials)
+    prob_err = get_binomial_error(success, trials)
+    if verbose:
+        print "Probability:"
+        print "%lf +/- %lf" % (prob, prob_err)
+    return prob, prob_err
+
+def get_wald_interval(success, trials, z=1.96):
+    """Compute the Wald interval of a binomial probability
+    (prob +/- z*prob_err, clipped to [0,1])
+
+    @param success number of successes
+    @param trials number of trials
+    @param z number of standard deviations (1.96 for 95% confidence)
+    @return values low, high (interval bounds)
+    """
+    prob = success / float(trials)
+    half = z * get_binomial_error(success, trials)
+    return max(0., prob - half), min(1., prob + half)
+
+def get_wilson_interval(success, trials, z=1.96):
+    """Compute the Wilson score interval of a binomial probability
+    (unlike prob +/- prob_err, it stays inside [0,1] and does not
+    shrink to zero when there are no successes or no failures)
+
+    @param success number of successes
+    @param trials number of trials
+    @param z number of standard deviations (1.96 for 95% confidence)
+    @return values low, high (interval bounds)
+    """
+    prob = success / float(trials)
+    z2 = z*z / float(trials)
+    center = (prob + z2/2.) / (1. + z2)
+    half = z * sqrt( prob*(1.-prob)/float(trials) + z2/(4.*trials) ) / (1. + z2)
+    return center - half, center + half
+
+def get_beta_fraction(x, a, b):
+    """Continued fraction of the incomplete beta function
+    (modified Lentz's method, see get_beta_cdf)"""
+    tiny = 1e-300
+    c = 1.
+    d = 1. - (a+b) * x / (a+1.)
+    d = 1. / (d if abs(d) > tiny else tiny)
+    h = d
+    m = 1
+    while True:
+        #even step
+        aa = m * (b-m) * x / ((a-1.+2*m) * (a+2*m))
+        d = 1. + aa*d
+        d = 1. / (d if abs(d) > tiny else tiny)
+        c = 1. + aa/c
+        c = c if abs(c) > tiny else tiny
+        h *= d*c
+        #odd step
+        aa = -(a+m) * (a+b+m) * x / ((a+2*m) * (a+1.+2*m))
+        d = 1. + aa*d
+        d = 1. / (d if abs(d) > tiny else tiny)
+        c = 1. + aa/c
+        c = c if abs(c) > tiny else tiny
+        delta = d*c
+        h *= delta
+        if abs(delta - 1.) < 1e-15:
+            return h
+        m += 1
+
+def get_beta_cdf(x, a, b):
+    """Regularized incomplete beta function I_x(a,b)
+    (cumulative distribution of the Beta(a,b) distribution)"""
+    if x <= 0.:
+        return 0.
+    if x >= 1.:
+        return 1.
+    front = exp( lgamma(a+b) - lgamma(a) - lgamma(b) + a*log(x) + b*log(1.-x) )
+    if x < (a+1.) / (a+b+2.):
+        return front * get_beta_fraction(x, a, b) / a
+    return 1. - front * get_beta_fraction(1.-x, b, a) / b
+
+def get_beta_quantile(q, a, b):
+    """Inverse of get_beta_cdf in x (by bisection)."""
+    low, high = 0., 1.
+    for i in range(100):
+        mid = (low + high) / 2.
+        if get_beta_cdf(mid, a, b) < q:
+            low = mid
+        else:
+            high = mid
+        if high - low < 1e-15:
+            break
+    return (low + high) / 2.
+
+def get_clopper_pearson_interval(success, trials, z=1.96):
+    """Compute the Clopper-Pearson ("exact") interval of a binomial
+    probability, from the quantiles of the Beta distribution
+    (conservative: its coverage is at least the nominal one)
+
+    @param success number of successes
+    @param trials number of trials
+    @param z number of standard deviations of the equivalent normal
+           interval (1.96 for 95% confidence)
+    @return values low, high (interval bounds)
+    """
+    alpha = erfc(z / sqrt(2.))
+    low = 0. if success == 0 else get_beta_quantile(alpha/2., success, trials-success+1)
+    high = 1. if success == trials else get_beta_quantile(1.-alpha/2., success+1, trials-success)
+    return low, high
+
+INTERVALS = {'wald': get_wald_interval,
+             'wilson': get_wilson_interval,
+             'clopper-pearson': get_clopper_pearson_interval}
+
+def get_interval(success, trials, method='wilson', z=1.96):
+    """Compute a confidence interval of a binomial probability
+    @param method 'wald', 'wilson' or 'clopper-pearson'
+           (see get_wald_interval etc.)
+    @return values low, high (interval bounds)
+    """
+    if method not in INTERVALS:
+        raise ValueError("Unknown interval '%s'" % method)
+    return INTERVALS[method](success, trials, z)
+
+def sequential_prob(blocks, target, interval='se', z=1.96, min_trials=1000, max_trials=None, verbose=True):
+    """Compute the binomial probability of success from a stream of
+    trials, stopping as soon as its uncertainty reaches a target.
+    The uncertainty is checked after each block, so smaller blocks
+    stop closer to the required number of trials.
+
+    @param blocks iterable over blocks of trials: boolean arrays or
+           (successes, trials) pairs (see count_successes)
+    @param target required uncertainty
+    @param interval uncertainty: 'se' (binomial standard error, as
+           get_binomial_prob) or the half-width of an interval
+           ('wald', 'wilson' or 'clopper-pearson', see get_interval)
+    @param z number of standard deviations of the interval
+    @param min_trials minimum number of trials (so that a few early
+           trials with the same outcome do not stop the estimate)
+    @param max_trials maximum number of trials (None: no limit)
+    @param verbose print probability, uncertainty and trials
+    @return values prob, prob_err, trials (probability, its uncertainty
+            and number of trials used)
+    """
+    if interval != 'se' and interval not in INTERVALS:
+        raise ValueError("Unknown interval '%s'" % interval)
+    counts = BinomialCounts()
+    prob, prob_err = 0., float('inf')
+    for block in blocks:
+        counts.update(block)
+        if not counts.trials:
+            continue
+        prob = counts.prob()
+        if interval == 'se':
+            prob_err = counts.get_error()
+        else:
+            low, high = counts.get_interval(interval, z)
+            prob_err = (high - low) / 2.
+        if counts.trials >= min_trials and prob_err <= target:
+            break
+        if max_trials is not None and counts.trials >= max_trials:
+            break
+    if verbose:
+        print "Probability (%d trials):" % counts.trials
+        print "%lf +/- %lf" % (prob, prob_err)
+    return prob, prob_err, counts.trials
@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+from setuptools import setup
+
+setup(name='quant-puzzles',
+      version='0.1',
+      description='Utilities shared by the quant puzzles',
+      packages=['quant_puzzles'],
+      install_requires=['numpy'])